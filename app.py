@@ -1,19 +1,51 @@
 import os
 import re
+import math
+import asyncio
+import hashlib
+import hmac
 import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from io import BytesIO
 from typing import List, Optional
+from urllib.parse import quote
 
+import anyio.to_thread
 import boto3
 from botocore.config import Config
-from fastapi import FastAPI, HTTPException, Query, UploadFile, File
+from botocore.exceptions import ClientError
+from fastapi import FastAPI, Header, HTTPException, Query, UploadFile, File
 from fastapi.responses import Response
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
+from PIL import __version__ as PIL_VERSION
+from PIL import features as PIL_FEATURES
+import numpy as np
 import httpx
 
 log = logging.getLogger(__name__)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # Startup, in order: report the environment, size the thread pools, then
+    # warm the caches the first requests would otherwise fill. The helpers
+    # are defined with the code they warm, further down.
+    _log_imaging_backend()
+    _check_r2_env()
+    _size_render_threads()
+    _prewarm_codecs()
+    _prewarm_fonts()
+    _prewarm_gradients()
+    _prewarm_static_layers()
+    yield
+
+
+app = FastAPI(lifespan=_lifespan)
 
 
 @app.get("/")
@@ -23,6 +55,24 @@ def root():
 
 VERSION = "P1+P2+P3+P4+P5+P6+P7+P8 v2026-04-16b"
 
+# zlib level for PNG responses. Level 1 encodes a card ~1.5x faster than
+# Pillow's default 6 for ~30-40% more bytes: worth it for on-the-fly renders.
+# PNG_LEVEL overrides it (0-9) where egress matters more than CPU.
+PNG_COMPRESS_LEVEL = int(os.environ.get("PNG_LEVEL") or 1)
+
+# Opt-in response formats (?fmt=). Lossy WebP at q90 is visually clean on the
+# flat card art and roughly 5–10x smaller than the PNG; method 4 is libwebp's
+# default speed/size trade-off; it keeps the alpha band. JPEG is the fastest
+# encode, for clients without WebP. It has no alpha, and cards are not fully
+# opaque (translucent text/pill fills punch through to alpha ~110–235), so
+# RGBA cards are flattened onto JPEG_BACKGROUND the way a viewer shows the PNG.
+# fmt=auto picks WebP when the Accept header lists it, PNG otherwise.
+OUTPUT_MEDIA_TYPES = {"png": "image/png", "webp": "image/webp", "jpeg": "image/jpeg"}
+WEBP_QUALITY = 90
+WEBP_METHOD = 4
+JPEG_QUALITY = 90
+JPEG_BACKGROUND = (255, 255, 255)
+
 # ======================== STICKER UI STANDARDS ========================
 STICKER_RADIUS = 14
 STICKER_BORDER_W = 3
@@ -157,42 +207,347 @@ GLOW_Y_OFFSET = 30  # was 50 — pull glow up so it cradles the reel body
 GLOW_NOISE = 3
 
 
+# Worker threads for render work. Each in-flight render holds a few 4 MB
+# canvases, so cap concurrency near the core count instead of AnyIO's 40.
+RENDER_THREADS = int(os.environ.get("RENDER_THREADS") or (os.cpu_count() or 1) * 2)
+
+# R2 GETs from async routes run on their own, larger pool: they mostly wait
+# on the network, and sharing RENDER_THREADS would let a burst of slow GETs
+# hold up CPU-bound renders (and vice versa).
+R2_IO_THREADS = int(os.environ.get("R2_IO_THREADS") or 32)
+_r2_io_pool = ThreadPoolExecutor(max_workers=R2_IO_THREADS, thread_name_prefix="r2-io")
+
+# One pooled R2 connection per thread that can issue a GET (the P1 executor,
+# AnyIO's workers and the R2 I/O pool), or the overflow is discarded and the
+# next GET pays a fresh TLS handshake.
+R2_POOL_CONNECTIONS = max(50, RENDER_THREADS * 2 + R2_IO_THREADS)
+
+
 # ---------- R2 client ----------
+# Connection settings are read once at import; the deploy sets them before
+# the process starts and they never change while it runs.
+R2_ENDPOINT          = os.environ.get("R2_ENDPOINT") or ""
+R2_ACCESS_KEY_ID     = os.environ.get("R2_ACCESS_KEY_ID")
+R2_SECRET_ACCESS_KEY = os.environ.get("R2_SECRET_ACCESS_KEY")
+R2_BUCKET            = os.environ.get("R2_BUCKET")
+if R2_ENDPOINT and not R2_ENDPOINT.startswith(("http://", "https://")):
+    R2_ENDPOINT = "https://" + R2_ENDPOINT
+
+# Built once and shared: boto3 clients are thread-safe, and constructing one
+# (service model load, endpoint resolution) costs far more than a GET.
+_r2_client = None
+_r2_client_lock = threading.Lock()
+
+
 def r2_client():
-    endpoint = os.environ.get("R2_ENDPOINT")
-    access_key = os.environ.get("R2_ACCESS_KEY_ID")
-    secret_key = os.environ.get("R2_SECRET_ACCESS_KEY")
+    global _r2_client
+    if _r2_client is None:
+        with _r2_client_lock:
+            if _r2_client is None:
+                _r2_client = _build_r2_client()
+    return _r2_client
 
-    if not endpoint or not access_key or not secret_key:
-        raise HTTPException(status_code=500, detail="Missing R2 env vars")
 
-    if not endpoint.startswith("http://") and not endpoint.startswith("https://"):
-        endpoint = "https://" + endpoint
+def _build_r2_client():
+    if not R2_ENDPOINT or not R2_ACCESS_KEY_ID or not R2_SECRET_ACCESS_KEY:
+        raise HTTPException(status_code=500, detail="Missing R2 env vars")
 
     return boto3.client(
         "s3",
-        endpoint_url=endpoint,
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
+        endpoint_url=R2_ENDPOINT,
+        aws_access_key_id=R2_ACCESS_KEY_ID,
+        aws_secret_access_key=R2_SECRET_ACCESS_KEY,
         region_name="auto",
-        config=Config(signature_version="s3v4"),
+        config=Config(
+            signature_version="s3v4",
+            max_pool_connections=R2_POOL_CONNECTIONS,
+            # Pooled connections can sit idle between bursts; keepalive stops
+            # NAT/LB idle timeouts from silently dropping them mid-pool.
+            tcp_keepalive=True,
+            # Fail fast on a stuck edge instead of botocore's 60 s defaults;
+            # adaptive mode retries throttles/5xx with client-side backoff.
+            # total_max_attempts counts the first try: 4 = up to 3 retries.
+            connect_timeout=2,
+            read_timeout=10,
+            retries={"total_max_attempts": 4, "mode": "adaptive"},
+        ),
     )
 
 
+# ---------- R2 reads over plain HTTPS ----------
+# GETs are the hot path, and boto3 spends more CPU on its request/response
+# model than the signature costs. Reads go through a pooled httpx.Client with
+# SigV4 headers built here; writes (rare) stay on boto3. USE_BOTO3=1 sends
+# reads back through boto3 too.
+USE_BOTO3 = os.environ.get("USE_BOTO3") == "1"
+R2_READ_ATTEMPTS = 3
+_UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"   # what boto3 sends for S3 over HTTPS
+
+
+@lru_cache(maxsize=4)
+def _sigv4_signing_key(datestamp: str) -> bytes:
+    k = ("AWS4" + R2_SECRET_ACCESS_KEY).encode()
+    for part in (datestamp, "auto", "s3", "aws4_request"):
+        k = hmac.new(k, part.encode(), hashlib.sha256).digest()
+    return k
+
+
+def _sigv4_sign(method: str, host: str, path: str, amz_date: Optional[str] = None) -> dict:
+    """SigV4 headers for a bodiless S3 request (region "auto", as R2 expects).
+    Only host and x-amz-* are signed, so Range/If-* can be added unsigned."""
+    amz_date = amz_date or time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    datestamp = amz_date[:8]
+    scope = f"{datestamp}/auto/s3/aws4_request"
+    signed = "host;x-amz-content-sha256;x-amz-date"
+    canonical = "\n".join((
+        method, path, "",
+        f"host:{host}",
+        f"x-amz-content-sha256:{_UNSIGNED_PAYLOAD}",
+        f"x-amz-date:{amz_date}",
+        "", signed, _UNSIGNED_PAYLOAD,
+    ))
+    to_sign = "\n".join((
+        "AWS4-HMAC-SHA256", amz_date, scope,
+        hashlib.sha256(canonical.encode()).hexdigest(),
+    ))
+    sig = hmac.new(_sigv4_signing_key(datestamp), to_sign.encode(), hashlib.sha256).hexdigest()
+    return {
+        "x-amz-date": amz_date,
+        "x-amz-content-sha256": _UNSIGNED_PAYLOAD,
+        "Authorization": (
+            f"AWS4-HMAC-SHA256 Credential={R2_ACCESS_KEY_ID}/{scope}, "
+            f"SignedHeaders={signed}, Signature={sig}"
+        ),
+    }
+
+
+class _R2HttpReader:
+    """get_object() over httpx, shaped like boto3's: returns Body/ETag/
+    ContentRange and raises ClientError carrying the HTTP status and S3 error
+    code, so _r2_read and the slot loaders work with either client."""
+
+    def __init__(self):
+        self._base = R2_ENDPOINT.rstrip("/")
+        self._host = httpx.URL(self._base).netloc.decode()
+        self._http = httpx.Client(
+            timeout=httpx.Timeout(10.0, connect=2.0),
+            limits=httpx.Limits(max_connections=R2_POOL_CONNECTIONS,
+                                max_keepalive_connections=R2_POOL_CONNECTIONS),
+        )
+
+    def get_object(self, Bucket: str, Key: str, Range: Optional[str] = None,
+                   IfMatch: Optional[str] = None, IfNoneMatch: Optional[str] = None) -> dict:
+        path = "/" + quote(f"{Bucket}/{Key}", safe="/~")
+        extra = {"Range": Range, "If-Match": IfMatch, "If-None-Match": IfNoneMatch}
+        # Retry transport errors, throttles and 5xx with a short backoff,
+        # like the boto3 client's retry config.
+        for attempt in range(R2_READ_ATTEMPTS):
+            last = attempt + 1 == R2_READ_ATTEMPTS
+            headers = _sigv4_sign("GET", self._host, path)
+            headers.update((k, v) for k, v in extra.items() if v)
+            try:
+                resp = self._http.get(self._base + path, headers=headers)
+            except httpx.TransportError:
+                if last:
+                    raise
+            else:
+                if last or (resp.status_code < 500 and resp.status_code != 429):
+                    break
+            time.sleep(0.05 * 2 ** attempt)
+        if resp.status_code >= 300:
+            m = re.search(r"<Code>([^<]+)</Code>", resp.text)
+            raise ClientError(
+                {"Error": {"Code": m.group(1) if m else str(resp.status_code),
+                           "Message": resp.reason_phrase},
+                 "ResponseMetadata": {"HTTPStatusCode": resp.status_code}},
+                "GetObject",
+            )
+        return {
+            "Body": BytesIO(resp.content),
+            "ETag": resp.headers.get("etag", ""),
+            "ContentRange": resp.headers.get("content-range", ""),
+            "ContentLength": len(resp.content),
+        }
+
+
+_r2_reader = None
+
+
+def r2_reader():
+    """Client for R2 GETs — the httpx reader, or boto3 with USE_BOTO3=1."""
+    global _r2_reader
+    if USE_BOTO3:
+        return r2_client()
+    if _r2_reader is None:
+        with _r2_client_lock:
+            if _r2_reader is None:
+                if not R2_ENDPOINT or not R2_ACCESS_KEY_ID or not R2_SECRET_ACCESS_KEY:
+                    raise HTTPException(status_code=500, detail="Missing R2 env vars")
+                _r2_reader = _R2HttpReader()
+    return _r2_reader
+
+
+# ---------- R2 object cache ----------
+R2_CACHE_MAX_BYTES = 64 * 1024 * 1024   # raw object bytes kept in-process
+R2_CACHE_TTL_S     = 60                 # served without touching R2 for this long,
+                                        # then revalidated with a conditional GET
+# Revalidation answers that mean the cached copy is really gone or no longer
+# readable. Anything else (5xx, throttling left after retries, transport
+# errors) is R2 being unwell, and the stale copy keeps being served.
+R2_CACHE_EVICT_STATUSES = (403, 404, 412)
+
+
+class _ByteLRU:
+    """Thread-safe LRU bounded by the total size of its values in bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()   # key -> (value, nbytes)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def put(self, key, value, nbytes: int):
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._items[key] = (value, nbytes)
+            self._size += nbytes
+            while self._size > self.max_bytes:
+                _, (_, n) = self._items.popitem(last=False)
+                self._size -= n
+
+    def pop(self, key):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+
+
+_r2_cache = _ByteLRU(R2_CACHE_MAX_BYTES)   # key -> (data, etag, fetched_at)
+
+# Rendered cards, keyed by every input that affects the pixels: the route's
+# params, the source object's ETag and VERSION (so layout changes invalidate).
+RENDER_CACHE_MAX_BYTES = 32 * 1024 * 1024
+_render_cache = _ByteLRU(RENDER_CACHE_MAX_BYTES)
+
+
+def _render_cache_key(*parts) -> str:
+    h = hashlib.sha1(VERSION.encode())
+    for p in parts:
+        h.update(b"\0" + str(p).encode())
+    return h.hexdigest()
+
+
+# The render cache key doubles as the response ETag. Heroes can be replaced
+# under the same R2 key, so clients revalidate after the R2 cache TTL instead
+# of treating the URL as immutable.
+RENDER_CACHE_CONTROL = f"public, max-age={R2_CACHE_TTL_S}"
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
 def r2_get_object_bytes(key: str) -> bytes:
-    bucket = os.environ.get("R2_BUCKET")
+    return r2_get_object(key)[0]
+
+
+def r2_get_object(key: str) -> tuple:
+    """Fetch an object as (bytes, etag), through the in-process cache.
+    Fresh entries skip R2 entirely; stale ones are revalidated with
+    If-None-Match so an unchanged object costs a 304, not a re-download."""
+    bucket = R2_BUCKET
     if not bucket:
         raise HTTPException(status_code=500, detail="Missing R2_BUCKET")
 
-    s3 = r2_client()
+    cached = _r2_cache.get(key)
+    now = time.monotonic()
+    if cached and now - cached[2] < R2_CACHE_TTL_S:
+        return cached[0], cached[1]
+
+    s3 = r2_reader()
     try:
-        obj = s3.get_object(Bucket=bucket, Key=key)
-        return obj["Body"].read()
+        if cached:
+            data, etag = _r2_read(s3, bucket, key, IfNoneMatch=cached[1])
+        else:
+            data, etag = _r2_read(s3, bucket, key)
+    except ClientError as e:
+        status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        if cached and status == 304:
+            _r2_cache.put(key, (cached[0], cached[1], now), len(cached[0]))
+            return cached[0], cached[1]
+        if cached and status not in R2_CACHE_EVICT_STATUSES:
+            log.warning("R2 revalidation of %s failed (%s); serving stale copy", key, e)
+            return cached[0], cached[1]
+        _r2_cache.pop(key)
+        raise HTTPException(status_code=404, detail=f"R2 get_object failed: {e}")
     except Exception as e:
+        if cached:
+            log.warning("R2 revalidation of %s failed (%s); serving stale copy", key, e)
+            return cached[0], cached[1]
         raise HTTPException(status_code=404, detail=f"R2 get_object failed: {e}")
 
+    _r2_cache.put(key, (data, etag, now), len(data))
+    return data, etag
+
+
+# Objects are fetched in R2_PART_BYTES ranges. The first range doubles as the
+# size probe (no HEAD round trip), so small heroes still cost one GET; larger
+# ones pull their remaining ranges in parallel — a single stream tops out
+# well below what R2 serves to several concurrent readers.
+R2_PART_BYTES    = 1024 * 1024
+R2_RANGE_WORKERS = 8
+_r2_range_pool   = ThreadPoolExecutor(max_workers=R2_RANGE_WORKERS, thread_name_prefix="r2-range")
+
+
+def _r2_read(s3, bucket: str, key: str, **kw) -> tuple:
+    """GET an object as (bytes, etag), in parallel byte ranges when it is
+    larger than one part. kw (e.g. IfNoneMatch) applies to the first GET."""
+    try:
+        first = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{R2_PART_BYTES - 1}", **kw)
+    except ClientError as e:
+        if e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") != 416:
+            raise
+        first = s3.get_object(Bucket=bucket, Key=key, **kw)  # empty object
+    head = first["Body"].read()
+    etag = first.get("ETag", "")
+    content_range = first.get("ContentRange") or ""
+    total = int(content_range.rsplit("/", 1)[1]) if "/" in content_range else len(head)
+    if total <= len(head):
+        return head, etag
+
+    def part(start: int) -> bytes:
+        end = min(start + R2_PART_BYTES, total) - 1
+        # IfMatch: fail rather than stitch together two versions of the object.
+        obj = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}", IfMatch=etag)
+        return obj["Body"].read()
+
+    buf = bytearray(total)
+    buf[:len(head)] = head
+    starts = range(len(head), total, R2_PART_BYTES)
+    for start, chunk in zip(starts, _r2_range_pool.map(part, starts)):
+        buf[start:start + len(chunk)] = chunk
+    return bytes(buf), etag
+
 
 # ---------- Fonts ----------
+# Cached per size: truetype() re-parses the TTF on every call, and fit_text
+# probes dozens of sizes per card. Sizes come from code, so the set is small.
+@lru_cache(maxsize=None)
 def load_font_regular(size: int) -> ImageFont.FreeTypeFont:
     for path in [
         os.path.join(os.path.dirname(__file__), "assets", "fonts", "Inter_18pt-Medium.ttf"),
@@ -205,6 +560,7 @@ def load_font_regular(size: int) -> ImageFont.FreeTypeFont:
     return ImageFont.load_default()
 
 
+@lru_cache(maxsize=None)
 def load_font_bold(size: int) -> ImageFont.FreeTypeFont:
     for path in [
         os.path.join(os.path.dirname(__file__), "assets", "fonts", "ArchivoNarrow-Bold.ttf"),
@@ -217,21 +573,49 @@ def load_font_bold(size: int) -> ImageFont.FreeTypeFont:
     return ImageFont.load_default()
 
 
+# Measurement-only draw for memoized fitters; textbbox never touches pixels.
+_MEASURE_DRAW = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+
+
 def fit_text(draw, text, max_w, start_size, min_size=16, loader=load_font_regular):
-    size = start_size
-    while size >= min_size:
-        font = loader(size)
-        w, _ = text_size(draw, text, font)
+    # Brand/model strings repeat across renders; the fit only depends on these
+    # args (draw is unused), and the fonts returned are the shared cached ones.
+    return _fit_text(text, max_w, start_size, min_size, loader)
+
+
+@lru_cache(maxsize=1024)
+def _fit_text(text, max_w, start_size, min_size, loader):
+    # Fit on ink width (textbbox), as drawn. getlength's advance width can be
+    # narrower than the ink, which would let text overrun max_w.
+    def fits(size):
+        return ink_width(text, loader(size)) <= max_w
+
+    # Same result as stepping down 2pt at a time from start_size, but text
+    # width scales ~linearly with size: measure once, jump to the estimate,
+    # then walk the 2pt grid to the largest size that really fits.
+    lowest = start_size - (start_size - min_size) // 2 * 2
+    if start_size >= min_size:
+        w = ink_width(text, loader(start_size))
         if w <= max_w:
-            return font, text
-        size -= 2
+            return loader(start_size), text
+        if lowest < start_size:
+            est = start_size * max_w / w
+            size = start_size - 2 * math.ceil((start_size - est) / 2)
+            size = min(max(size, lowest), start_size - 2)
+            if fits(size):
+                while size + 2 < start_size and fits(size + 2):
+                    size += 2
+                return loader(size), text
+            while size - 2 >= lowest:
+                size -= 2
+                if fits(size):
+                    return loader(size), text
     font = loader(min_size)
     truncated = text
     while len(truncated) > 1:
         truncated = truncated[:-1].rstrip()
         candidate = truncated + "…"
-        w, _ = text_size(draw, candidate, font)
-        if w <= max_w:
+        if ink_width(candidate, font) <= max_w:
             return font, candidate
     return loader(min_size), text
 
@@ -245,17 +629,37 @@ def fit_text_p3_model(draw, text, max_w, loader=load_font_bold, start_size=210):
       Phase 3 – truncate at size 80 with "…"
     Returns (font, line1, line2_or_None).
     """
+    # Memoized like fit_text: the fit depends only on the text, width, loader
+    # and start size (draw only supplies textbbox, same for every RGBA canvas).
+    return _fit_text_p3_model(text, max_w, loader, start_size)
+
+
+@lru_cache(maxsize=512)
+def _fit_text_p3_model(text, max_w, loader, start_size):
+    draw = _MEASURE_DRAW
     # ── Phase 1: single line ──────────────────────────────────────────
-    for size in range(start_size, 80 - 1, -2):
-        font = loader(size)
-        w, _ = text_size(draw, text, font)
-        if w <= max_w:
-            return font, text, None
+    # Width grows with size, so bisect the 2pt grid for the largest size
+    # that fits instead of measuring every step down from start_size.
+    def fits(size):
+        return text_size(draw, text, loader(size))[0] <= max_w
+
+    floor = start_size - (start_size - 80) // 2 * 2   # smallest grid size >= 80
+    if start_size >= 80 and fits(start_size):
+        return loader(start_size), text, None
+    if floor < start_size and fits(floor):
+        too_wide, ok = start_size, floor
+        while too_wide - ok > 2:
+            mid = ok + (too_wide - ok) // 4 * 2
+            if fits(mid):
+                ok = mid
+            else:
+                too_wide = mid
+        return loader(ok), text, None
 
     # ── Phase 2: two-line wrap ────────────────────────────────────────
     words = text.split()
     if len(words) >= 2:
-        for size in range(136, 52 - 1, -2):
+        def best_split(size):
             font = loader(size)
             best = None
             best_balance = float('inf')
@@ -269,8 +673,24 @@ def fit_text_p3_model(draw, text, max_w, loader=load_font_bold, start_size=210):
                     if balance < best_balance:
                         best_balance = balance
                         best = (l1, l2)
-            if best:
-                return font, best[0], best[1]
+            return best
+
+        # A split that fits at one size fits at every smaller one, so bisect
+        # the 136→52 grid like phase 1 rather than trying each size in turn.
+        best = best_split(136)
+        if best:
+            return loader(136), best[0], best[1]
+        best = best_split(52)
+        if best:
+            too_wide, ok = 136, 52
+            while too_wide - ok > 2:
+                mid = ok + (too_wide - ok) // 4 * 2
+                split = best_split(mid)
+                if split:
+                    ok, best = mid, split
+                else:
+                    too_wide = mid
+            return loader(ok), best[0], best[1]
 
     # ── Phase 3: truncate at size 80 ─────────────────────────────────
     font = loader(80)
@@ -286,25 +706,55 @@ def fit_text_p3_model(draw, text, max_w, loader=load_font_bold, start_size=210):
 
 # ---------- Drawing helpers ----------
 def draw_rounded_rect(draw: ImageDraw.ImageDraw, xy, radius: int, fill):
-    try:
-        draw.rounded_rectangle(xy, radius=radius, fill=fill)
-    except Exception:
-        draw.rectangle(xy, fill=fill)
+    # rounded_rectangle exists in every Pillow we support (>= 12.1); a bad box
+    # raises from rectangle() just the same, so no fallback.
+    draw.rounded_rectangle(xy, radius=radius, fill=fill)
+
+
+@lru_cache(maxsize=64)
+def _rounded_tile(w: int, h: int, radius: int, fill) -> Image.Image:
+    """Translucent rounded rect as a (w+1)x(h+1) tile, for alpha_composite at
+    (x0, y0) in place of drawing (x0, y0, x0+w, y0+h) on a full-canvas overlay.
+    Shared across requests — callers must not draw on it."""
+    tile = Image.new("RGBA", (w + 1, h + 1), (0, 0, 0, 0))
+    ImageDraw.Draw(tile).rounded_rectangle((0, 0, w, h), radius=radius, fill=fill)
+    return tile
 
 
 def text_size(draw: ImageDraw.ImageDraw, text: str, font: ImageFont.ImageFont):
-    bbox = draw.textbbox((0, 0), text, font=font)
+    bbox = draw_text_bbox(draw, text, font)
     return (bbox[2] - bbox[0], bbox[3] - bbox[1])
 
 
+def draw_text_bbox(draw: ImageDraw.ImageDraw, text: str, font: ImageFont.ImageFont):
+    """draw.textbbox((0, 0), text, font=font), from the shared cache whenever
+    draw antialiases text (every RGB(A)/L canvas; same bbox on all of them)."""
+    if draw.fontmode == "L":
+        return text_bbox(text, font)
+    return draw.textbbox((0, 0), text, font=font)
+
+
+@lru_cache(maxsize=4096)
+def text_bbox(text: str, font: ImageFont.ImageFont):
+    """draw.textbbox((0, 0), ...) for antialiased text, cached — chip, badge
+    and CTA strings repeat across renders and fonts are shared instances."""
+    return _MEASURE_DRAW.textbbox((0, 0), text, font=font)
+
+
+def ink_width(text: str, font: ImageFont.ImageFont) -> int:
+    """Inked width of antialiased text — text_size's width, from the cache."""
+    bbox = text_bbox(text, font)
+    return bbox[2] - bbox[0]
+
+
 def draw_text_align_left(draw, x, y, text, font, fill):
-    bbox = draw.textbbox((0, 0), text, font=font)
+    bbox = draw_text_bbox(draw, text, font)
     left_bearing = bbox[0]
     draw.text((x - left_bearing, y), text, font=font, fill=fill)
 
 
 def draw_text_centered_in_box(draw, box_x0, box_y0, box_w, box_h, text, font, fill):
-    bbox = draw.textbbox((0, 0), text, font=font)
+    bbox = draw_text_bbox(draw, text, font)
     text_w = bbox[2] - bbox[0]
     text_h = bbox[3] - bbox[1]
     tx = box_x0 + (box_w - text_w) // 2 - bbox[0]
@@ -312,18 +762,44 @@ def draw_text_centered_in_box(draw, box_x0, box_y0, box_w, box_h, text, font, fi
     draw.text((tx, ty), text, font=font, fill=fill)
 
 
-def draw_sticker_pill(draw, x0, y0, x1, y1, text, font):
-    draw_rounded_rect(draw, (x0, y0, x1, y1), radius=STICKER_RADIUS, fill=STICKER_FILL)
-    draw.rounded_rectangle((x0, y0, x1, y1), radius=STICKER_RADIUS,
-                            outline=STICKER_OUTLINE, width=STICKER_BORDER_W)
+@lru_cache(maxsize=64)
+def _rounded_shell(w: int, h: int, radius: int, fill, outline, width: int):
+    """Rounded rect (fill and/or outline may be None) drawn once as a
+    (w+1)x(h+1) tile, with the mask of the pixels it covers. paste(tile, xy,
+    mask) writes exactly what rounded_rectangle would at (x, y, x+w, y+h).
+    Shared — read only."""
+    tile = Image.new("RGBA", (w + 1, h + 1), (0, 0, 0, 0))
+    ImageDraw.Draw(tile).rounded_rectangle((0, 0, w, h), radius=radius, fill=fill,
+                                           outline=outline, width=width)
+    mask = Image.new("L", tile.size, 0)
+    ImageDraw.Draw(mask).rounded_rectangle((0, 0, w, h), radius=radius,
+                                           fill=None if fill is None else 255,
+                                           outline=None if outline is None else 255,
+                                           width=width)
+    return tile, mask
+
+
+def draw_sticker_pill(canvas, draw, x0, y0, x1, y1, text, font):
+    # The pill depends only on the text size, so the shell is cached.
+    tile, mask = _rounded_shell(x1 - x0, y1 - y0, STICKER_RADIUS, STICKER_FILL,
+                                STICKER_OUTLINE, STICKER_BORDER_W)
+    canvas.paste(tile, (x0, y0), mask)
     draw_text_centered_in_box(draw, x0, y0, x1 - x0, y1 - y0, text, font, STICKER_TEXT)
 
 
 def draw_text_with_shadow(draw, x, y, text, font, fill, shadow_color=(0, 0, 0, 160), shadow_offset=2):
-    """Draw text with a soft drop shadow for readability on any background."""
+    """Draw text with a soft drop shadow for readability on any background.
+
+    The glyphs are rasterized once into an L coverage mask, then stamped for
+    each shadow pass and the text itself; draw.bitmap blends exactly like
+    draw.text does at integer coordinates.
+    """
+    l, t, r, b = font.getbbox(text)
+    mask = Image.new("L", (r - l, b - t), 0)
+    ImageDraw.Draw(mask).text((-l, -t), text, font=font, fill=255)
     for dx, dy in [(-1, shadow_offset), (1, shadow_offset), (0, shadow_offset), (0, 1)]:
-        draw.text((x + dx, y + dy), text, font=font, fill=shadow_color)
-    draw.text((x, y), text, font=font, fill=fill)
+        draw.bitmap((x + dx + l, y + dy + t), mask, fill=shadow_color)
+    draw.bitmap((x + l, y + t), mask, fill=fill)
 
 
 def _draw_spec_value(draw, x, row_top, row_h, text, font, fill, max_w):
@@ -340,7 +816,7 @@ def _draw_spec_value(draw, x, row_top, row_h, text, font, fill, max_w):
     Row height is never changed; the caller owns layout geometry.
     """
     def _place_single(t, cy):
-        bbox = draw.textbbox((0, 0), t, font=font)
+        bbox = draw_text_bbox(draw, t, font)
         draw.text((x, cy - bbox[1]), t, font=font, fill=fill)
 
     _, lh = text_size(draw, text, font)
@@ -410,6 +886,12 @@ def _draw_spec_value(draw, x, row_top, row_h, text, font, fill, max_w):
     _place_single(text[:1] + "…", row_top + (row_h - lh) // 2)
 
 
+# Blur radius of the glow, and how far past the ellipses the blur can reach
+# (Pillow's box-blur approximation of r=50 spreads < 120 px).
+GLOW_BLUR_RADIUS = 50
+GLOW_BLUR_PAD = 3 * GLOW_BLUR_RADIUS
+
+
 def draw_radial_glow(canvas: Image.Image, center_x: int, center_y: int,
                      glow_w: int = GLOW_W, glow_h: int = GLOW_H,
                      color: tuple = GLOW_COLOR, max_alpha: int = GLOW_ALPHA,
@@ -417,8 +899,16 @@ def draw_radial_glow(canvas: Image.Image, center_x: int, center_y: int,
     import random
     cy = center_y + y_offset
     w, h = canvas.size
-    glow = Image.new("RGBA", (w, h), (0, 0, 0, 0))
-    glow_draw = ImageDraw.Draw(glow)
+    # Draw and blur only the ellipses' box plus the blur's reach: outside it
+    # the full-canvas layer stays fully transparent, so the result is the same.
+    bx0 = max(0, center_x - glow_w - GLOW_BLUR_PAD)
+    by0 = max(0, cy - glow_h - GLOW_BLUR_PAD)
+    bx1 = min(w, center_x + glow_w + 1 + GLOW_BLUR_PAD)
+    by1 = min(h, cy + glow_h + 1 + GLOW_BLUR_PAD)
+    if bx1 <= bx0 or by1 <= by0:
+        return
+    alpha = Image.new("L", (bx1 - bx0, by1 - by0), 0)
+    glow_draw = ImageDraw.Draw(alpha)
     steps = 30
     for i in range(steps):
         t = i / steps
@@ -429,20 +919,36 @@ def draw_radial_glow(canvas: Image.Image, center_x: int, center_y: int,
             a = max(0, min(255, a + random.randint(-noise_amp, noise_amp)))
         if a <= 0:
             continue
-        x0 = center_x - ew
-        y0 = cy - eh
-        x1 = center_x + ew
-        y1 = cy + eh
-        glow_draw.ellipse((x0, y0, x1, y1), fill=(color[0], color[1], color[2], a))
-    glow = glow.filter(ImageFilter.GaussianBlur(radius=50))
-    canvas.alpha_composite(glow)
+        x0 = center_x - ew - bx0
+        y0 = cy - eh - by0
+        x1 = center_x + ew - bx0
+        y1 = cy + eh - by0
+        glow_draw.ellipse((x0, y0, x1, y1), fill=a)
+    # The RGBA layer this stands in for is `color` wherever an ellipse landed
+    # and 0 elsewhere, and GaussianBlur works per band — so blur the alpha
+    # plus one coverage mask per distinct colour value (a single one for the
+    # white default) instead of all four bands.
+    blur = ImageFilter.GaussianBlur(radius=GLOW_BLUR_RADIUS)
+    covered = {v: alpha.point([0] + [v] * 255).filter(blur) for v in set(color[:3])}
+    glow = Image.merge("RGBA", [covered[v] for v in color[:3]] + [alpha.filter(blur)])
+    canvas.alpha_composite(glow, (bx0, by0))
+
+
+def _as_rgba(im: Image.Image) -> Image.Image:
+    """im in RGBA, decoded. convert() to the same mode still copies every
+    pixel, and RGBA is the norm for cutout PNGs, so hand those back without
+    it — but load() them here, as convert() would, so a truncated or corrupt
+    file raises inside the caller's try rather than mid-render."""
+    if im.mode == "RGBA":
+        im.load()
+        return im
+    return im.convert("RGBA")
 
 
 def trim_transparent(im: Image.Image, pad: int = 0) -> Image.Image:
-    if im.mode != "RGBA":
-        im = im.convert("RGBA")
-    alpha = im.split()[-1]
-    bbox = alpha.getbbox()
+    im = _as_rgba(im)
+    # RGBA getbbox() scans the alpha plane in place — no band split/copy.
+    bbox = im.getbbox(alpha_only=True)
     if not bbox:
         return im
     x0, y0, x1, y1 = bbox
@@ -450,21 +956,103 @@ def trim_transparent(im: Image.Image, pad: int = 0) -> Image.Image:
     y0 = max(0, y0 - pad)
     x1 = min(im.width, x1 + pad)
     y1 = min(im.height, y1 + pad)
+    if (x0, y0, x1, y1) == (0, 0, im.width, im.height):
+        return im  # nothing to trim (e.g. opaque JPEG) — skip the full copy
     return im.crop((x0, y0, x1, y1))
 
 
+def _composite_hero(canvas: Image.Image, hero: Image.Image, xy, rgb_out: bool = False) -> None:
+    """alpha_composite the hero at xy. When its alpha is only 0/255 the same
+    pixels come out of paste — unmasked for fully opaque heroes (JPEG product
+    shots, a memcpy per row), masked for hard-edged cutouts.
+
+    rgb_out: the canvas is opaque, nothing is drawn over the hero and the card
+    is encoded as RGB. A masked paste then gives the same RGB at any alpha
+    (only the discarded alpha channel differs), about twice as fast."""
+    if rgb_out and hero.mode == "RGBA":
+        canvas.paste(hero, xy, hero)
+        return
+    if hero.mode == "RGBA":
+        hist = hero.getchannel("A").histogram()
+        if not any(hist[1:255]):
+            canvas.paste(hero, xy, None if hist[0] == 0 else hero)
+            return
+    canvas.alpha_composite(hero, xy)
+
+
+# Heroes shrunk 6×+ are box-reduced by an integer factor before LANCZOS does
+# the rest — far fewer taps, alpha within a few levels of a full LANCZOS pass.
+HERO_REDUCING_GAP = 3.0
+
+
+def _resize_hero(im: Image.Image, size) -> Image.Image:
+    """LANCZOS resize with reducing_gap. Pillow resizes RGBA via premultiplied
+    RGBa internally but drops reducing_gap on that path, so convert here."""
+    if im.mode == "RGBA":
+        im = im.convert("RGBa").resize(size, Image.LANCZOS, reducing_gap=HERO_REDUCING_GAP)
+        return im.convert("RGBA")
+    return im.resize(size, Image.LANCZOS, reducing_gap=HERO_REDUCING_GAP)
+
+
+def _png_bytes(im: Image.Image, **save_kw) -> bytes:
+    """Encode im as PNG. BytesIO.getvalue() hands over its buffer without
+    copying it, and a plain Response keeps Content-Length — streaming the
+    BytesIO would only add chunked framing and per-chunk awaits."""
+    out = BytesIO()
+    im.save(out, format="PNG", **save_kw)
+    return out.getvalue()
+
+
+def _output_format(fmt: Optional[str], accept: Optional[str] = None) -> str:
+    fmt = (fmt or "png").lower()
+    if fmt == "auto":
+        return "webp" if "image/webp" in (accept or "") else "png"
+    if fmt == "jpg":
+        fmt = "jpeg"
+    if fmt not in OUTPUT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported fmt: {fmt}")
+    return fmt
+
+
+def _format_headers(fmt: Optional[str]) -> dict:
+    """Vary on Accept when the format was negotiated from it (fmt=auto)."""
+    return {"Vary": "Accept"} if (fmt or "").lower() == "auto" else {}
+
+
+def _encode_image(im: Image.Image, fmt: str = "png") -> bytes:
+    """Encode a finished card in a validated OUTPUT_MEDIA_TYPES format."""
+    if fmt == "webp":
+        out = BytesIO()
+        im.save(out, format="WEBP", quality=WEBP_QUALITY, method=WEBP_METHOD)
+        return out.getvalue()
+    if fmt == "jpeg":
+        if im.mode == "RGBA":
+            # Blend over the background; convert("RGB") would drop the alpha.
+            flat = Image.new("RGB", im.size, JPEG_BACKGROUND)
+            flat.paste(im, mask=im.getchannel("A"))
+        else:
+            flat = im.convert("RGB")
+        out = BytesIO()
+        flat.save(out, format="JPEG", quality=JPEG_QUALITY)
+        return out.getvalue()
+    return _png_bytes(im, compress_level=PNG_COMPRESS_LEVEL)
+
+
 # ---------- Icon loading ----------
 ASSETS_DIR = os.path.join(os.path.dirname(__file__), "assets", "p1")
 BG_DIR = os.path.join(ASSETS_DIR, "backgrounds")
 ICONS_DIR = os.path.join(ASSETS_DIR, "icons")
 
 
+@lru_cache(maxsize=64)
 def load_icon(filename: str, box_size: int) -> Optional[Image.Image]:
+    """Decoded, boxed icon — shared across requests, only ever used as a
+    composite source, so callers must not draw on it."""
     path = os.path.join(ICONS_DIR, filename)
     if not os.path.exists(path):
         return None
     try:
-        icon = Image.open(path).convert("RGBA")
+        icon = _as_rgba(Image.open(path))
         scale = min(box_size / icon.width, box_size / icon.height)
         new_w = max(1, int(icon.width * scale))
         new_h = max(1, int(icon.height * scale))
@@ -483,16 +1071,83 @@ CHIP_ICONS = {
 }
 
 
+# ---------- Startup (run in order by _lifespan) ----------
+def _log_imaging_backend():
+    # Pillow-SIMD reports a ".postN" version; plain Pillow does not.
+    log.info("imaging backend: Pillow %s", PIL_VERSION)
+
+
+def _check_r2_env():
+    # Warn once at boot instead of discovering it on the first R2 request;
+    # /health and the non-R2 routes keep working either way.
+    missing = [name for name, value in (
+        ("R2_ENDPOINT", R2_ENDPOINT), ("R2_ACCESS_KEY_ID", R2_ACCESS_KEY_ID),
+        ("R2_SECRET_ACCESS_KEY", R2_SECRET_ACCESS_KEY), ("R2_BUCKET", R2_BUCKET),
+    ) if not value]
+    if missing:
+        log.warning("R2 disabled, missing env: %s", ", ".join(missing))
+
+
+def _size_render_threads():
+    # Sync routes (P3–P8) run on AnyIO's limiter; asyncio.to_thread (P1, P2) on
+    # the loop's default executor. Size both from RENDER_THREADS.
+    anyio.to_thread.current_default_thread_limiter().total_tokens = RENDER_THREADS
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=RENDER_THREADS, thread_name_prefix="render"))
+
+
+def _prewarm_codecs():
+    # Image.open imports format plugins lazily on first use; register them all
+    # and round-trip a tiny image through every output codec before traffic.
+    Image.init()
+    probe = Image.new("RGBA", (8, 8))
+    for fmt in OUTPUT_MEDIA_TYPES:
+        if fmt == "webp" and not PIL_FEATURES.check("webp"):
+            # Only ?fmt=webp requests need it; don't keep the service down.
+            log.warning("Pillow built without WebP; fmt=webp requests will fail")
+            continue
+        Image.open(BytesIO(_encode_image(probe, fmt))).load()
+
+
+# Fixed sizes the renderers draw with; fit_text sizes vary and load lazily.
+PREWARM_BOLD_SIZES    = (18, 20, 22, 25, 26, 32, 33, 34, 36, 38, 44, 48, 52, 425)
+PREWARM_REGULAR_SIZES = (16, 18, 26, 30, 32)
+
+
+def _prewarm_fonts():
+    # Fonts are lru_cached; parse the fixed-size faces once before traffic.
+    for size in PREWARM_BOLD_SIZES:
+        load_font_bold(size)
+    for size in PREWARM_REGULAR_SIZES:
+        load_font_regular(size)
+
+
+def _prewarm_gradients():
+    # Build every themed background up front (P1 is 1000², P3–P8 are 1024²)
+    # so the first request per theme doesn't pay for it.
+    for theme in THEME_COLORS:
+        _theme_gradient_bg(theme, P1_CANVAS_W, P1_CANVAS_H)
+        _theme_gradient_bg(theme, 1024, 1024)
+
+
+def _prewarm_static_layers():
+    # Parameter-free layers: the P1 bottom fade, and the CTA bar (constant
+    # text) per theme.
+    _p1_fade_strip()
+    for theme in THEME_COLORS:
+        _p1_cta_strip(theme)
+
+
 # ---------- Routes ----------
 @app.get("/health")
 def health():
-    return {"ok": True, "version": VERSION}
+    return {"ok": True, "version": VERSION, "pillow": PIL_VERSION}
 
 
 @app.post("/r2/upload")
 async def r2_upload(key: str, file: UploadFile = File(...)):
     """Upload a file to R2. Used by marketing pipeline to store hero photos."""
-    bucket = os.environ.get("R2_BUCKET")
+    bucket = R2_BUCKET
     if not bucket:
         raise HTTPException(status_code=500, detail="Missing R2_BUCKET")
     s3 = r2_client()
@@ -501,6 +1156,7 @@ async def r2_upload(key: str, file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="Empty file")
     try:
         s3.put_object(Bucket=bucket, Key=key, Body=data, ContentType=file.content_type or "image/png")
+        _r2_cache.pop(key)   # drop any stale cached copy
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"R2 upload failed: {e}")
     return {"ok": True, "key": key, "size": len(data)}
@@ -521,13 +1177,14 @@ def r2_upload_from_url(source_url: str, key: str):
     data = resp.content
     if not data or len(data) < 1000:
         raise HTTPException(status_code=400, detail="Downloaded file too small or empty")
-    bucket = os.environ.get("R2_BUCKET")
+    bucket = R2_BUCKET
     if not bucket:
         raise HTTPException(status_code=500, detail="Missing R2_BUCKET")
     s3 = r2_client()
     content_type = resp.headers.get("content-type", "image/jpeg")
     try:
         s3.put_object(Bucket=bucket, Key=key, Body=data, ContentType=content_type)
+        _r2_cache.pop(key)   # drop any stale cached copy
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"R2 upload failed: {e}")
     return {"ok": True, "key": key, "size": len(data)}
@@ -537,13 +1194,16 @@ def r2_upload_from_url(source_url: str, key: str):
 def get_image(key: str):
     data = r2_get_object_bytes(key)
     try:
-        hero = Image.open(BytesIO(data)).convert("RGBA")
-        hero = trim_transparent(hero, pad=0)
+        src = Image.open(BytesIO(data))
+        rgba = _as_rgba(src)
+        hero = trim_transparent(rgba, pad=0)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Not a valid image: {e}")
-    out = BytesIO()
-    hero.save(out, format="PNG")
-    return Response(content=out.getvalue(), media_type="image/png")
+    if hero is rgba and src.format == "PNG" and src.mode == "RGBA":
+        # Nothing to trim on an RGBA PNG — the stored bytes are the answer.
+        return Response(content=data, media_type="image/png")
+    png = _png_bytes(hero, compress_level=PNG_COMPRESS_LEVEL)
+    return Response(content=png, media_type="image/png")
 
 
 def load_bg(theme: str):
@@ -551,7 +1211,7 @@ def load_bg(theme: str):
     path = os.path.join(BG_DIR, f"{t}.png")
     if not os.path.exists(path):
         path = os.path.join(BG_DIR, "yellow.png")
-    return Image.open(path).convert("RGBA")
+    return _as_rgba(Image.open(path))
 
 
 # =====================================================================
@@ -560,6 +1220,10 @@ def load_bg(theme: str):
 # Uses gradient backgrounds (not PNG bg files)
 # =====================================================================
 
+P1_CANVAS_W = 1000
+P1_CANVAS_H = 1000
+
+
 def _make_gradient_bg(W: int, H: int, color_start: tuple, color_end: tuple) -> Image.Image:
     """Create a diagonal gradient background (155deg approx: top-left to bottom-right)."""
     canvas = Image.new("RGBA", (W, H), (0, 0, 0, 255))
@@ -575,19 +1239,28 @@ def _make_gradient_bg(W: int, H: int, color_start: tuple, color_end: tuple) -> I
 
 
 def _make_gradient_bg_fast(W: int, H: int, color_start: tuple, color_end: tuple) -> Image.Image:
-    """Fast gradient using numpy-like row blending."""
-    import struct
-    canvas = Image.new("RGBA", (W, H))
-    pixels = []
-    for y in range(H):
-        for x in range(W):
-            t = (x * 0.42 + y * 0.91) / (W * 0.42 + H * 0.91)
-            r = int(color_start[0] + (color_end[0] - color_start[0]) * t)
-            g = int(color_start[1] + (color_end[1] - color_start[1]) * t)
-            b = int(color_start[2] + (color_end[2] - color_start[2]) * t)
-            pixels.append((r, g, b, 255))
-    canvas.putdata(pixels)
-    return canvas
+    """Vectorised _make_gradient_bg — same float math and truncation, so the
+    output is bit-identical, ~1 s of per-pixel Python on a cold theme → ~20 ms."""
+    t = (np.arange(W, dtype=np.float64)[None, :] * 0.42
+         + np.arange(H, dtype=np.float64)[:, None] * 0.91) / (W * 0.42 + H * 0.91)
+    px = np.empty((H, W, 4), dtype=np.uint8)
+    for c in range(3):
+        px[..., c] = (color_start[c] + (color_end[c] - color_start[c]) * t).astype(np.int64)
+    px[..., 3] = 255
+    return Image.fromarray(px)  # (H, W, 4) uint8 → RGBA
+
+
+@lru_cache(maxsize=16)
+def _cached_gradient_bg(W: int, H: int, color_start: tuple, color_end: tuple) -> Image.Image:
+    """Shared gradient canvas — never draw on it directly, .copy() first."""
+    return _make_gradient_bg_fast(W, H, color_start, color_end)
+
+
+def _theme_gradient_bg(theme: str, W: int, H: int) -> Image.Image:
+    """Cached themed gradient (shared instance — callers .copy() before drawing)."""
+    tc = get_theme_colors(theme)
+    return _cached_gradient_bg(W, H, tc.get("p1_grad_start", (13, 92, 92)),
+                               tc.get("p1_grad_end", (7, 56, 56)))
 
 
 def _draw_diagonal_stripe(canvas: Image.Image, W: int, H: int, tc: dict):
@@ -700,12 +1373,7 @@ def _draw_color_variant_strip(canvas: Image.Image, y_center: int,
     y0 = y_center - box_h // 2
 
     # bg pill
-    overlay = Image.new("RGBA", (W, H), (0, 0, 0, 0))
-    od = ImageDraw.Draw(overlay)
-    od.rounded_rectangle((x0, y0, x0 + box_w, y0 + box_h),
-                         radius=radius, fill=(0, 0, 0, 140))
-    canvas.alpha_composite(overlay)
-    draw = ImageDraw.Draw(canvas)
+    canvas.alpha_composite(_rounded_tile(box_w, box_h, radius, (0, 0, 0, 140)), (x0, y0))
 
     cur_x = x0 + pad_x
     lh = text_size(draw, label, label_font)[1]
@@ -780,47 +1448,66 @@ def _draw_stats_bar(canvas: Image.Image, y_top: int, W: int,
     return pill_h
 
 
-def _render_product(
-    hero: Image.Image,
-    theme: str,
-    brand: str,
-    model: str,
-    chip1: str,
-    chip2: str,
-    chip3: str,
-    chip4: str = "",
-    chip5: str = "",
-    bearings: str = "",
-    gear_ratio: str = "",
-    max_drag: str = "",
-    product_type: str = "reel",
-    color_variants: str = "",
-) -> bytes:
-    """Compose a 1000x1000 P1 product card (K + Hybrid Mix design).
+# ── Exact dimensions from 400px mockup × 2.5 ────────────────────────
+P1_LEFT    = 55    # mockup: left 22px
+P1_TOP     = 45    # mockup: top 18px
+P1_RIGHT   = 55    # mockup: right 18px → from right edge
+P1_CTA_H   = 100   # mockup: height 40px
+P1_STATS_H = 110   # mockup: stat row ~44px from bottom (P1-B only)
 
-    All dimensions scaled exactly from the 400px HTML mockup (×2.5).
-    P1-A = no stats (budget), P1-B = with stats bar (mid-premium).
-    """
-    W, H = 1000, 1000
+
+@lru_cache(maxsize=8)
+def _p1_cta_strip(theme: str) -> Image.Image:
+    """Full-width CTA bar (mockup: h 40 → 100, font 13 → 33). The opaque bar
+    replaces whatever is under it, so it is drawn once per theme and pasted."""
+    W, CTA_H = P1_CANVAS_W, P1_CTA_H
+    tc = get_theme_colors(theme)
+    cta_bg = tc.get("cta_bg", (245, 204, 74, 255))
+    cta_text_color = tc.get("cta_text", (17, 17, 17, 255))
+    strip = Image.new("RGBA", (W, CTA_H), cta_bg)
+    draw = ImageDraw.Draw(strip)
+    cta_font = load_font_bold(33)
+    cta_full = "READY STOCK  \u25C6  FAST SHIP"
+    cw, ch = text_size(draw, cta_full, cta_font)
+    cx = (W - cw) // 2
+    cy = (CTA_H - ch) // 2 - 4  # nudge up for visual center
+    draw.text((cx, cy), cta_full, font=cta_font, fill=cta_text_color)
+    return strip
+
+
+P1_FADE_H = 75
+
+
+@lru_cache(maxsize=1)
+def _p1_fade_strip() -> Image.Image:
+    """Bottom gradient fade as a W x P1_FADE_H tile — the rest of a
+    full-canvas fade layer was transparent, so only these rows change."""
+    W = P1_CANVAS_W
+    fade = Image.new("RGBA", (W, P1_FADE_H), (0, 0, 0, 0))
+    fd = ImageDraw.Draw(fade)
+    for y in range(P1_FADE_H):
+        a = int(26 * (y / P1_FADE_H))
+        fd.line([(0, y), (W, y)], fill=(0, 0, 0, a))
+    return fade
+
+
+@lru_cache(maxsize=8)
+def _p1_base_layer(theme: str, brand: str, model: str, size_text: str,
+                   has_stats: bool) -> Image.Image:
+    """Everything P1 draws beneath the hero (gradient, accent line, stripe,
+    watermark, brand, model, size badge). It depends only on these args, so
+    it is cached — shared instance, callers .copy() before drawing on it."""
+    W, H = P1_CANVAS_W, P1_CANVAS_H
     tc = get_theme_colors(theme)
     text_color = tc["text"]
     accent = tc.get("accent", (245, 204, 74, 255))
 
     # ── 0. Gradient background ───────────────────────────────────────
-    grad_start = tc.get("p1_grad_start", (13, 92, 92))
-    grad_end = tc.get("p1_grad_end", (7, 56, 56))
-    canvas = _make_gradient_bg_fast(W, H, grad_start, grad_end)
+    canvas = _theme_gradient_bg(theme, W, H).copy()
     draw = ImageDraw.Draw(canvas)
 
-    has_stats = any(s.strip() for s in [bearings, gear_ratio, max_drag])
-
-    # ── Exact dimensions from 400px mockup × 2.5 ────────────────────
-    LEFT   = 55       # mockup: left 22px
-    TOP    = 45       # mockup: top 18px
-    RIGHT  = 55       # mockup: right 18px → from right edge
-    CTA_H  = 100      # mockup: height 40px
-    STATS_H  = 110 if has_stats else 0   # mockup: stat row ~44px from bottom
-    STATS_PAD = 35    # mockup: left/right 14px
+    LEFT, TOP, RIGHT, CTA_H = P1_LEFT, P1_TOP, P1_RIGHT, P1_CTA_H
+    STATS_H = P1_STATS_H if has_stats else 0
 
     # ── 1. Gold top accent line (3px mockup → 8px) ───────────────────
     top_accent_color = tc.get("top_accent", accent)
@@ -837,11 +1524,9 @@ def _render_product(
             ad.line([(x, 0), (x, 7)], fill=(top_accent_color[0], top_accent_color[1],
                                              top_accent_color[2], a))
     canvas.alpha_composite(accent_overlay)
-    draw = ImageDraw.Draw(canvas)
 
     # ── 2. Diagonal stripe ───────────────────────────────────────────
     _draw_diagonal_stripe(canvas, W, H, tc)
-    draw = ImageDraw.Draw(canvas)
 
     # ── 3. Ghost watermark (P1-B only) ───────────────────────────────
     # mockup: font-size 170px → 425px, bottom 55px → 138px from bottom
@@ -856,7 +1541,6 @@ def _render_product(
             wm_draw.text((W - ww + 25, H - CTA_H - STATS_H - wh + 20),
                          wm_text, font=wm_font, fill=wm_color)
             canvas.alpha_composite(wm_layer)
-            draw = ImageDraw.Draw(canvas)
 
     # ── 4. Brand text (Canva-style: bolder, larger uppercase) ──
     # was: regular 30px / brand_color rgba (255,255,255,128)
@@ -882,7 +1566,6 @@ def _render_product(
     draw_text_align_left(draw, LEFT, MODEL_Y, model_text, model_font, text_color)
 
     # ── 7. Outlined badge (mockup: top 18 → 45, right 18 → 45, font 10 → 25, pad 4/14 → 10/35)
-    size_text = (chip3 or "").strip()
     if size_text:
         badge_font = load_font_bold(25)
         badge_border = tc.get("badge_border", accent)
@@ -890,6 +1573,44 @@ def _render_product(
         _draw_outlined_badge(draw, size_text, W - RIGHT, TOP + 5,
                              badge_font, badge_border, badge_text_c)
 
+    return canvas
+
+
+def _render_product(
+    hero: Image.Image,
+    theme: str,
+    brand: str,
+    model: str,
+    chip1: str,
+    chip2: str,
+    chip3: str,
+    chip4: str = "",
+    chip5: str = "",
+    bearings: str = "",
+    gear_ratio: str = "",
+    max_drag: str = "",
+    product_type: str = "reel",
+    color_variants: str = "",
+    fmt: str = "png",
+) -> bytes:
+    """Compose a 1000x1000 P1 product card (K + Hybrid Mix design).
+
+    All dimensions scaled exactly from the 400px HTML mockup (×2.5).
+    P1-A = no stats (budget), P1-B = with stats bar (mid-premium).
+    """
+    W, H = P1_CANVAS_W, P1_CANVAS_H
+    tc = get_theme_colors(theme)
+    accent = tc.get("accent", (245, 204, 74, 255))
+
+    has_stats = any(s.strip() for s in [bearings, gear_ratio, max_drag])
+
+    LEFT, RIGHT, CTA_H = P1_LEFT, P1_RIGHT, P1_CTA_H
+    STATS_H = P1_STATS_H if has_stats else 0
+
+    # ── 0–7. Background, brand/model header and size badge (cached) ──
+    canvas = _p1_base_layer(theme, brand, model, (chip3 or "").strip(), has_stats).copy()
+    draw = ImageDraw.Draw(canvas)
+
     # ── 8. Feature chips ─────────────────────────────────────────────
     # mockup: top 112 → 280, font 10 → 25, gap 5 → 13, pad 4/10 → 10/25, border 2.5 → 6
     features = [(chip1 or "").strip(), (chip2 or "").strip(),
@@ -941,7 +1662,7 @@ def _render_product(
         scale = hero_zone_h / hero_h
         new_w = max(1, int(hero_w * scale))
         new_h = max(1, int(hero_h * scale))
-    hero_rs = hero.resize((new_w, new_h), resample=Image.LANCZOS)
+    hero_rs = _resize_hero(hero, (new_w, new_h))
 
     # Position: center-right (60% mark) so hero doesn't overlap left text
     hero_center_x = int(W * 0.58)
@@ -953,9 +1674,7 @@ def _render_product(
 
     # Glow + Hero composite
     draw_radial_glow(canvas, px + new_w // 2, py + new_h // 2)
-    draw = ImageDraw.Draw(canvas)
-    canvas.alpha_composite(hero_rs, (px, py))
-    draw = ImageDraw.Draw(canvas)
+    _composite_hero(canvas, hero_rs, (px, py))
 
     # ── 10. Draw feature chips (shifted down to clear bigger title) ──
     if features:
@@ -966,13 +1685,8 @@ def _render_product(
         for c in features:
             tw, th = text_size(draw, c, chip_font)
             cw = tw + CHIP_PAD_X * 2 + CHIP_BORDER_W
-            chip_overlay = Image.new("RGBA", (W, H), (0, 0, 0, 0))
-            cd = ImageDraw.Draw(chip_overlay)
-            cd.rounded_rectangle(
-                (LEFT, chip_start_y, LEFT + cw, chip_start_y + chip_h),
-                radius=10, fill=chip_bg)
-            canvas.alpha_composite(chip_overlay)
-            draw = ImageDraw.Draw(canvas)
+            canvas.alpha_composite(_rounded_tile(cw, chip_h, 10, chip_bg),
+                                   (LEFT, chip_start_y))
             # Left border accent
             draw.rectangle(
                 [(LEFT, chip_start_y + 4),
@@ -985,15 +1699,8 @@ def _render_product(
             chip_start_y += chip_h + CHIP_GAP
 
     # ── 11. Bottom gradient fade (mockup: height 30 → 75) ───────────
-    fade = Image.new("RGBA", (W, H), (0, 0, 0, 0))
-    fd = ImageDraw.Draw(fade)
-    fade_h = 75
-    fade_top = H - CTA_H - STATS_H - fade_h
-    for y in range(fade_h):
-        a = int(26 * (y / fade_h))
-        fd.line([(0, fade_top + y), (W, fade_top + y)], fill=(0, 0, 0, a))
-    canvas.alpha_composite(fade)
-    draw = ImageDraw.Draw(canvas)
+    fade_top = H - CTA_H - STATS_H - P1_FADE_H
+    canvas.alpha_composite(_p1_fade_strip(), (0, fade_top))
 
     # ── 11b. Color variant swatch strip (only if 2+ variants) ────────
     # Placed just above the fade / stats bar, bottom-left.
@@ -1001,43 +1708,66 @@ def _render_product(
     if len(variants) >= 2:
         strip_y = fade_top - 30   # sits above the fade line
         _draw_color_variant_strip(canvas, strip_y, variants, tc)
-        draw = ImageDraw.Draw(canvas)
 
     # ── 12. Stats bar (P1-B only) ────────────────────────────────────
     # mockup: bottom 44, left/right 14, gap 4, stat-val 19→48, stat-lbl 7→18
     if has_stats:
         stats_y = H - CTA_H - STATS_H
         _draw_stats_bar(canvas, stats_y, W, bearings, gear_ratio, max_drag, tc, product_type)
-        draw = ImageDraw.Draw(canvas)
 
-    # ── 13. Full-width CTA bar (mockup: h 40 → 100, font 13 → 33) ──
-    cta_bg = tc.get("cta_bg", (245, 204, 74, 255))
-    cta_text_color = tc.get("cta_text", (17, 17, 17, 255))
-    draw.rectangle([(0, H - CTA_H), (W, H)], fill=cta_bg)
-    cta_font = load_font_bold(33)
-    cta_full = "READY STOCK  \u25C6  FAST SHIP"
-    cw, ch = text_size(draw, cta_full, cta_font)
-    cx = (W - cw) // 2
-    cy = H - CTA_H + (CTA_H - ch) // 2 - 4  # nudge up for visual center
-    draw.text((cx, cy), cta_full, font=cta_font, fill=cta_text_color)
+    # ── 13. Full-width CTA bar (cached per theme) ───────────────────
+    canvas.paste(_p1_cta_strip(theme), (0, H - CTA_H))
+
+    return _encode_image(canvas, fmt)
 
-    out = BytesIO()
-    canvas.convert("RGBA").save(out, format="PNG")
-    return out.getvalue()
 
+# P1 never draws the hero larger than ~720px on its long edge; JPEG heroes are
+# DCT-downscaled during decode, but never below 2× that.
+P1_HERO_DRAFT_PX = 1440
+# P2–P8 cards are 1024² and never draw a hero beyond the canvas; same 2× rule.
+CARD_HERO_DRAFT_PX = 2048
 
-def _load_hero(key: str) -> Image.Image:
+
+def _open_rgba(data: bytes, draft_px: Optional[int] = None) -> Image.Image:
+    """Decode image bytes to RGBA. With draft_px, JPEGs are decoded via
+    libjpeg's 1/2–1/8 scaling, keeping both sides >= draft_px."""
+    im = Image.open(BytesIO(data))
+    if draft_px and im.format == "JPEG":
+        im.draft("RGB", (draft_px, draft_px))
+    return _as_rgba(im)
+
+
+def _load_hero(key: str, draft_px: Optional[int] = None) -> Image.Image:
     """Load hero from R2, trim transparency."""
-    data = r2_get_object_bytes(key)
+    return _decode_hero(r2_get_object_bytes(key), draft_px)
+
+
+def _decode_hero(data: bytes, draft_px: Optional[int] = None) -> Image.Image:
     try:
-        hero = Image.open(BytesIO(data)).convert("RGBA")
+        hero = _open_rgba(data, draft_px)
         return trim_transparent(hero, pad=6)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Not a valid image: {e}")
 
 
+def _render_hero_card(route: str, key: str, render, *args) -> bytes:
+    """render(hero, *args) for a single-hero card, through the render cache
+    (keyed on route, key, the hero's ETag and args)."""
+    data, etag = r2_get_object(key)
+    cache_key = _render_cache_key(route, key, etag, *args)
+    png = _render_cache.get(cache_key)
+    if png is None:
+        png = _render_hero_data(data, render, *args)
+        _render_cache.put(cache_key, png, len(png))
+    return png
+
+
+def _render_hero_data(data: bytes, render, *args) -> bytes:
+    return render(_decode_hero(data, CARD_HERO_DRAFT_PX), *args)
+
+
 @app.get("/render/p1")
-def render_p1(
+async def render_p1(
     key:   str = Query(...),
     brand: str = Query("Daiwa"),
     model: str = Query("RS"),
@@ -1052,14 +1782,39 @@ def render_p1(
     max_drag:     str = Query(""),
     product_type: str = Query("reel"),
     color_variants: str = Query(""),
+    fmt: str = Query("png"),
+    if_none_match: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
 ):
-    png = _render_product(
-        _load_hero(key), theme, brand, model,
-        chip1, chip2, chip3, chip4, chip5,
-        bearings=bearings, gear_ratio=gear_ratio, max_drag=max_drag,
-        product_type=product_type, color_variants=color_variants,
+    vary = _format_headers(fmt)
+    fmt = _output_format(fmt, accept)
+    # Pillow work runs off the event loop; the R2 fetch (on the I/O pool)
+    # overlaps with the themed gradient build (a no-op once that theme is cached).
+    loop = asyncio.get_running_loop()
+    (data, etag), _ = await asyncio.gather(
+        loop.run_in_executor(_r2_io_pool, r2_get_object, key),
+        asyncio.to_thread(_theme_gradient_bg, theme, P1_CANVAS_W, P1_CANVAS_H),
     )
-    return Response(content=png, media_type="image/png")
+    cache_key = _render_cache_key(
+        "p1", key, etag, brand, model, chip1, chip2, chip3, chip4, chip5,
+        theme, bearings, gear_ratio, max_drag, product_type, color_variants, fmt,
+    )
+    etag = f'"{cache_key}"'
+    headers = {"ETag": etag, "Cache-Control": RENDER_CACHE_CONTROL, **vary}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    body = _render_cache.get(cache_key)
+    if body is None:
+        hero = await asyncio.to_thread(_decode_hero, data, P1_HERO_DRAFT_PX)
+        body = await asyncio.to_thread(
+            _render_product,
+            hero, theme, brand, model,
+            chip1, chip2, chip3, chip4, chip5,
+            bearings=bearings, gear_ratio=gear_ratio, max_drag=max_drag,
+            product_type=product_type, color_variants=color_variants, fmt=fmt,
+        )
+        _render_cache.put(cache_key, body, len(body))
+    return Response(content=body, media_type=OUTPUT_MEDIA_TYPES[fmt], headers=headers)
 
 
 # =====================================================================
@@ -1078,7 +1833,20 @@ P2_SHADOW_BLUR   = 20        # gaussian blur radius  — was 28, reduced to cut
 P2_SHADOW_ALPHA  = 28        # 11% of 255 ≈ 28      — was 46 (18%), now ~11%
 
 
-def _render_p2_white(hero: Image.Image) -> bytes:
+def _black_over_white_lut() -> list:
+    """Value of white after alpha_composite of black at each alpha 0-255 —
+    taken from Pillow itself so the flattened P2 shadow matches it exactly."""
+    a = Image.frombytes("L", (256, 1), bytes(range(256)))
+    black = Image.new("L", a.size, 0)
+    white = Image.new("RGBA", a.size, (255, 255, 255, 255))
+    white.alpha_composite(Image.merge("RGBA", (black, black, black, a)))
+    return list(white.getchannel("R").tobytes())
+
+
+_P2_SHADE_LUT = _black_over_white_lut()
+
+
+def _render_p2_white(hero: Image.Image, fmt: str = "png") -> bytes:
     """
     Composite a transparent-background cutout onto a white 1024×1024 canvas
     with a deterministic alpha-derived drop shadow.
@@ -1091,40 +1859,59 @@ def _render_p2_white(hero: Image.Image) -> bytes:
     scale    = target_h / hh
     new_w    = max(1, int(hw * scale))
     new_h    = max(1, int(hh * scale))
-    hero_rs  = hero.resize((new_w, new_h), Image.LANCZOS)
+    hero_rs  = _resize_hero(hero, (new_w, new_h))
 
     # --- Centred placement ---
     px = (W - new_w) // 2
     py = (H - new_h) // 2
 
     # --- Build alpha-based shadow ---
-    # Extract alpha channel of the resized hero, blur it, fill with shadow colour
-    shadow_base = Image.new("RGBA", (W, H), (0, 0, 0, 0))
-    alpha_mask   = hero_rs.split()[3]                    # alpha channel
-    silhouette   = Image.new("RGBA", (new_w, new_h), (0, 0, 0, P2_SHADOW_ALPHA))
-    silhouette.putalpha(alpha_mask)
-    shadow_base.paste(silhouette, (px + P2_SHADOW_DX, py + P2_SHADOW_DY))
-    shadow_blurred = shadow_base.filter(ImageFilter.GaussianBlur(radius=P2_SHADOW_BLUR))
-
-    # --- Composite: white → shadow → hero ---
-    canvas = Image.new("RGBA", (W, H), (255, 255, 255, 255))
-    canvas.alpha_composite(shadow_blurred)
-    canvas.alpha_composite(hero_rs, (px, py))
-
-    out = BytesIO()
-    canvas.convert("RGB").save(out, format="PNG")   # RGB — no transparency needed
-    return out.getvalue()
+    # A black silhouette carrying the hero's own alpha (putalpha used to
+    # replace the P2_SHADOW_ALPHA fill, so that is what shipped), blurred.
+    # Its RGB is 0 throughout, so only the alpha band needs blurring, and only
+    # within the blur's reach of the silhouette — beyond that it stays clear.
+    pad = 3 * P2_SHADOW_BLUR
+    sx, sy = px + P2_SHADOW_DX, py + P2_SHADOW_DY
+    bx0, by0 = max(0, sx - pad), max(0, sy - pad)
+    bx1, by1 = min(W, sx + new_w + pad), min(H, sy + new_h + pad)
+    shadow_a = Image.new("L", (bx1 - bx0, by1 - by0), 0)
+    shadow_a.paste(hero_rs.getchannel("A"), (sx - bx0, sy - by0))
+    shadow_a = shadow_a.filter(ImageFilter.GaussianBlur(radius=P2_SHADOW_BLUR))
+
+    # --- Composite: white → shadow → hero, on an RGB canvas ---
+    # Black over white is grey, so the shadow flattens to one L plane via a
+    # LUT instead of an RGBA composite; the hero goes on with its own mask.
+    shade = Image.new("L", (W, H), 255)
+    shade.paste(shadow_a.point(_P2_SHADE_LUT), (bx0, by0))
+    canvas = Image.merge("RGB", (shade, shade, shade))
+    _composite_hero(canvas, hero_rs, (px, py), rgb_out=True)
+
+    return _encode_image(canvas, fmt)
 
 
 @app.get("/render/p2")
-def render_p2(key: str = Query(...)):
+async def render_p2(
+    key: str = Query(...),
+    fmt: str = Query("png"),
+    accept: Optional[str] = Header(None),
+):
     """
     P2 — pure beauty shot.
     White background, deterministic shadow, no text.
-    Only 'key' (R2 path to transparent cutout) is required.
+    Only 'key' (R2 path to transparent cutout) is required; fmt as for P1.
     """
-    hero = _load_hero(key)
-    return Response(content=_render_p2_white(hero), media_type="image/png")
+    vary = _format_headers(fmt)
+    fmt = _output_format(fmt, accept)
+    # As P1: the R2 fetch waits on the I/O pool, so only a cache miss takes
+    # a render thread.
+    loop = asyncio.get_running_loop()
+    data, etag = await loop.run_in_executor(_r2_io_pool, r2_get_object, key)
+    cache_key = _render_cache_key("p2", key, etag, fmt)
+    body = _render_cache.get(cache_key)
+    if body is None:
+        body = await asyncio.to_thread(_render_hero_data, data, _render_p2_white, fmt)
+        _render_cache.put(cache_key, body, len(body))
+    return Response(content=body, media_type=OUTPUT_MEDIA_TYPES[fmt], headers=vary)
 
 
 # =====================================================================
@@ -1293,15 +2080,15 @@ def _render_p3(
     max_drag: str,
     weight: str,
     product_type: str = "reel",
+    fmt: str = "png",
 ) -> bytes:
-    """Compose a 1024×1024 P3 spec card and return raw PNG bytes.
+    """Compose a 1024×1024 P3 spec card and return it encoded as fmt.
     Chips: chip1=BB count, chip2=gear ratio, chip3=max drag (range).
     Spec table: Gear Ratio / Max Drag / Weight (3 rows).
     Line capacity omitted — varies per size variant.
     """
     W, H = 1024, 1024
-    _tc = get_theme_colors(theme)
-    canvas = _make_gradient_bg_fast(W, H, _tc.get("p1_grad_start", (13, 92, 92)), _tc.get("p1_grad_end", (7, 56, 56)))
+    canvas = _theme_gradient_bg(theme, W, H).copy()
     draw   = ImageDraw.Draw(canvas)
 
     tc              = get_theme_colors(theme)
@@ -1342,17 +2129,18 @@ def _render_p3(
 
     chip_groups = []
     for i, c in enumerate(features):
-        tw, th    = text_size(draw, c, chip_font)
+        bbox      = draw_text_bbox(draw, c, chip_font)
+        tw, th    = bbox[2] - bbox[0], bbox[3] - bbox[1]
         icon_file = CHIP_ICONS.get(i)
         icon      = load_icon(icon_file, ICON_SIZE) if icon_file else None
         icon_w    = ICON_SIZE if icon else 0
         group_w   = (icon_w + ICON_TEXT_GAP + tw) if icon else tw
         group_h   = max(ICON_SIZE, th)
-        chip_groups.append((c, tw, th, group_w, group_h, icon, icon_w))
+        chip_groups.append((c, tw, th, bbox[1], group_w, group_h, icon, icon_w))
 
-    chip_row_h    = max((gh for _, _, _, _, gh, _, _ in chip_groups), default=0)
+    chip_row_h    = max((gh for _, _, _, _, _, gh, _, _ in chip_groups), default=0)
     num_dividers  = max(0, len(chip_groups) - 1)
-    total_chips_w = sum(gw for _, _, _, gw, _, _, _ in chip_groups)
+    total_chips_w = sum(gw for _, _, _, _, gw, _, _, _ in chip_groups)
     total_chips_w += num_dividers * (CHIP_GAP_X + DIVIDER_WIDTH)
 
     # ── Spec table metrics ────────────────────────────────────────────
@@ -1372,7 +2160,7 @@ def _render_p3(
     scale    = target_h / hh
     new_w    = max(1, int(hw * scale))
     new_h    = max(1, int(hh * scale))
-    hero_rs  = hero.resize((new_w, new_h), Image.LANCZOS)
+    hero_rs  = _resize_hero(hero, (new_w, new_h))
 
     # Position: centred in the zone between header bottom and chips/spec area
     needed_below = CHIP_TOP_GAP + chip_row_h + SPEC_GAP_Y + spec_table_h + BOTTOM_SAFE
@@ -1407,38 +2195,33 @@ def _render_p3(
         by0        = top_pad + 10
         bx0        = bx1 - bw
         by1        = by0 + bh
-        draw_sticker_pill(draw, bx0, by0, bx1, by1, sr_text, badge_font)
+        draw_sticker_pill(canvas, draw, bx0, by0, bx1, by1, sr_text, badge_font)
 
     # ── Glow + hero composite ─────────────────────────────────────────
     draw_radial_glow(canvas, px + new_w // 2, py + new_h // 2)
-    draw = ImageDraw.Draw(canvas)
-    canvas.alpha_composite(hero_rs, (px, py))
-    draw = ImageDraw.Draw(canvas)
+    _composite_hero(canvas, hero_rs, (px, py))
 
     # ── Chips row ─────────────────────────────────────────────────────
     chip_y_top    = hero_bottom + CHIP_TOP_GAP
     chip_y_center = chip_y_top + chip_row_h // 2
     chip_start_x  = (W - total_chips_w) // 2
     cur_x         = chip_start_x
+    div_half_h    = int(chip_row_h * 0.35)
+    last_idx      = len(chip_groups) - 1
 
-    for idx, (c, tw, th, gw, gh, icon, icon_w) in enumerate(chip_groups):
+    for idx, (c, tw, th, top, gw, gh, icon, icon_w) in enumerate(chip_groups):
         if icon:
             icon_y = chip_y_center - ICON_SIZE // 2
             canvas.alpha_composite(icon, (cur_x, icon_y))
-            draw   = ImageDraw.Draw(canvas)
             text_x = cur_x + icon_w + ICON_TEXT_GAP
         else:
             text_x = cur_x
-        bbox   = draw.textbbox((0, 0), c, font=chip_font)
-        text_h = bbox[3] - bbox[1]
-        text_y = chip_y_center - text_h // 2 - bbox[1]
+        text_y = chip_y_center - th // 2 - top
         draw.text((text_x, text_y), c, font=chip_font, fill=chip_text_color)
         cur_x += gw
-        if idx < len(chip_groups) - 1:
-            div_x     = cur_x + CHIP_GAP_X // 2
-            div_y_top = chip_y_center - int(chip_row_h * 0.35)
-            div_y_bot = chip_y_center + int(chip_row_h * 0.35)
-            draw.line([(div_x, div_y_top), (div_x, div_y_bot)],
+        if idx < last_idx:
+            div_x = cur_x + CHIP_GAP_X // 2
+            draw.line([(div_x, chip_y_center - div_half_h), (div_x, chip_y_center + div_half_h)],
                       fill=divider_color, width=DIVIDER_WIDTH)
             cur_x += CHIP_GAP_X + DIVIDER_WIDTH
 
@@ -1451,23 +2234,16 @@ def _render_p3(
     table_w  = table_x1 - table_x0
 
     # Subtle translucent background pill
-    spec_bg      = Image.new("RGBA", (W, H), (0, 0, 0, 0))
-    spec_bg_draw = ImageDraw.Draw(spec_bg)
-    bg_fill      = _P3_SPEC_BG_DARK if (theme or "").lower() in _P3_DARK_THEMES else _P3_SPEC_BG_LIGHT
-    spec_bg_draw.rounded_rectangle(
-        (table_x0, table_y, table_x1, table_y + spec_table_h),
-        radius=P3_SPEC_RADIUS,
-        fill=bg_fill,
-    )
-    canvas.alpha_composite(spec_bg)
-    draw = ImageDraw.Draw(canvas)
+    is_dark      = (theme or "").lower() in _P3_DARK_THEMES
+    bg_fill      = _P3_SPEC_BG_DARK if is_dark else _P3_SPEC_BG_LIGHT
+    canvas.alpha_composite(
+        _rounded_tile(table_w, spec_table_h, P3_SPEC_RADIUS, bg_fill), (table_x0, table_y))
 
     # Column positions: label left (24px inset), value at 38% of table width
     col_label_x  = table_x0 + 24
     col_value_x  = table_x0 + int(table_w * 0.38)
     max_value_w  = (table_x1 - 16) - col_value_x   # right edge minus 16px inset
 
-    is_dark = (theme or "").lower() in _P3_DARK_THEMES
     label_fill  = (255, 255, 255, 160) if is_dark else (60, 60, 60, 180)
     header_fill = (255, 255, 255, 110) if is_dark else (80, 80, 80, 140)
 
@@ -1503,9 +2279,7 @@ def _render_p3(
                 fill=divider_color, width=1,
             )
 
-    out = BytesIO()
-    canvas.convert("RGBA").save(out, format="PNG")
-    return out.getvalue()
+    return _encode_image(canvas, fmt)  # already RGBA
 
 
 @app.get("/render/p3")
@@ -1524,6 +2298,8 @@ def render_p3(
     line_capacity: str = Query("\u2014"),        # accepted but not rendered (varies per size)
     specs_paste:   str = Query(""),              # multi-model specs text; auto-extracts gear_ratio/max_drag/weight if individual fields are dashes
     product_type:  str = Query("reel"),
+    fmt:           str = Query("png"),             # png | webp | jpeg | auto (Accept)
+    accept:        Optional[str] = Header(None),
 ):
     """
     P3 — spec card. Themed background, brand/model header, size-range
@@ -1534,6 +2310,9 @@ def render_p3(
     If specs_paste is provided and individual spec fields are still default
     dashes, auto-extracts from specs_paste.
     """
+    vary = _format_headers(fmt)
+    fmt  = _output_format(fmt, accept)
+
     # Auto-extract from specs_paste if individual fields are dashes
     if specs_paste and specs_paste.strip():
         if product_type == "line":
@@ -1560,12 +2339,11 @@ def render_p3(
             if chip3 == "6 kg" and _extracted.get("max_drag"):
                 chip3 = _extracted["max_drag"]
 
-    hero = _load_hero(key)
-    png  = _render_p3(
-        hero, theme, brand, model, chip1, chip2, chip3,
-        size_range, gear_ratio, max_drag, weight, product_type,
+    png = _render_hero_card(
+        "p3", key, _render_p3, theme, brand, model, chip1, chip2, chip3,
+        size_range, gear_ratio, max_drag, weight, product_type, fmt,
     )
-    return Response(content=png, media_type="image/png")
+    return Response(content=png, media_type=OUTPUT_MEDIA_TYPES[fmt], headers=vary)
 
 
 # =====================================================================
@@ -1616,11 +2394,11 @@ def _render_p4(
     feature_title: str,
     feature_body: str,
     feature_tag: str,
+    fmt: str = "png",
 ) -> bytes:
-    """Compose a 1024×1024 P4 Feature Highlight card and return raw PNG bytes."""
+    """Compose a 1024×1024 P4 Feature Highlight card and return it encoded as fmt."""
     W, H   = 1024, 1024
-    _tc = get_theme_colors(theme)
-    canvas = _make_gradient_bg_fast(W, H, _tc.get("p1_grad_start", (13, 92, 92)), _tc.get("p1_grad_end", (7, 56, 56)))
+    canvas = _theme_gradient_bg(theme, W, H).copy()
     draw   = ImageDraw.Draw(canvas)
 
     tc         = get_theme_colors(theme)
@@ -1652,7 +2430,7 @@ def _render_p4(
     new_h   = max(1, int(H * P4_HERO_SCALE))
     scale   = new_h / hh
     new_w   = max(1, int(hw * scale))
-    hero_rs = hero.resize((new_w, new_h), Image.LANCZOS)
+    hero_rs = _resize_hero(hero, (new_w, new_h))
     px      = int(W * P4_HERO_X_FRAC)
     py      = int((H - new_h) / 2 + H * P4_HERO_Y_BIAS)
 
@@ -1683,9 +2461,7 @@ def _render_p4(
 
     # ── Glow + hero composite ─────────────────────────────────────────
     draw_radial_glow(canvas, px + new_w // 2, py + new_h // 2)
-    draw = ImageDraw.Draw(canvas)
-    canvas.alpha_composite(hero_rs, (px, py))
-    draw = ImageDraw.Draw(canvas)
+    _composite_hero(canvas, hero_rs, (px, py))
 
     # ── Brand + model header ──────────────────────────────────────────
     model_y = top_pad + brand_h - 4
@@ -1693,8 +2469,7 @@ def _render_p4(
     draw_text_align_left(draw, pad, model_y,   model_text, model_font, text_color)
 
     # Thin separator line below model — use bbox[3] for actual bottom
-    _model_bbox = draw.textbbox((pad, model_y), model_text, font=model_font)
-    sep_y   = _model_bbox[3] + 14
+    sep_y   = model_y + draw_text_bbox(draw, model_text, model_font)[3] + 14
     sep_end = int(W * P4_TEXT_W_FRAC) - 10
     sep_col = (text_color[0], text_color[1], text_color[2], 180)
     draw.line([(pad, sep_y), (sep_end, sep_y)], fill=sep_col, width=2)
@@ -1706,16 +2481,16 @@ def _render_p4(
 
     if tag_text:
         # Use bbox for precise title bottom, then centre tag pill between title and body
-        _title_bbox = draw.textbbox((pad, feat_y), title_text, font=title_font)
-        title_bottom = _title_bbox[3]
+        title_bottom = feat_y + draw_text_bbox(draw, title_text, title_font)[3]
         # Measure body height to calculate even spacing
         body_top_estimate = title_bottom + tag_h + 120  # rough total span
         gap_above = 56   # title → tag pill
         gap_below = 44   # tag pill → body (visually matches because pill has internal padding)
         tx0 = pad
         ty0 = title_bottom + gap_above
-        tx1, ty1 = tx0 + tag_w, ty0 + tag_h
-        draw_rounded_rect(draw, (tx0, ty0, tx1, ty1), radius=8, fill=tag_bg)
+        ty1 = ty0 + tag_h
+        tile, mask = _rounded_shell(tag_w, tag_h, 8, tag_bg, None, 1)
+        canvas.paste(tile, (tx0, ty0), mask)
         # Centre text inside pill using anchor='mm'
         pill_cx = tx0 + tag_w // 2
         pill_cy = ty0 + tag_h // 2
@@ -1729,9 +2504,7 @@ def _render_p4(
         draw_text_align_left(draw, pad, feat_y, line, body_font, body_col)
         feat_y += body_lh + 10
 
-    out = BytesIO()
-    canvas.convert("RGBA").save(out, format="PNG")
-    return out.getvalue()
+    return _encode_image(canvas, fmt)  # already RGBA
 
 
 @app.get("/render/p4")
@@ -1743,15 +2516,19 @@ def render_p4(
     feature_title: str = Query("POWER DRAG"),
     feature_body:  str = Query("Smooth, strong drag for fighting big fish."),
     feature_tag:   str = Query(""),
+    fmt:           str = Query("png"),             # png | webp | jpeg | auto (Accept)
+    accept:        Optional[str] = Header(None),
 ):
     """
     P4 — Feature Highlight card.
     Auto-zoomed hero (120% scale, right-anchored, top-biased),
     compact Brand/Model header, Feature Title + Tag pill + Body block.
     """
-    hero = _load_hero(key)
-    png  = _render_p4(hero, theme, brand, model, feature_title, feature_body, feature_tag)
-    return Response(content=png, media_type="image/png")
+    vary = _format_headers(fmt)
+    fmt  = _output_format(fmt, accept)
+    png = _render_hero_card("p4", key, _render_p4, theme, brand, model,
+                            feature_title, feature_body, feature_tag, fmt)
+    return Response(content=png, media_type=OUTPUT_MEDIA_TYPES[fmt], headers=vary)
 
 
 # =====================================================================
@@ -1789,10 +2566,10 @@ def _load_p5_hero(product_key: str, group: str):
         "P3_DETAIL_CUTOUT",
         "P1_HERO_CUTOUT",
     ]
-    bucket = os.environ.get("R2_BUCKET")
+    bucket = R2_BUCKET
     if not bucket:
         raise HTTPException(status_code=500, detail="Missing R2_BUCKET")
-    s3 = r2_client()
+    s3 = r2_reader()
     pk_norm = _normalize_pk(product_key)
     for slot in slots:
         for ext in ("png", "jpg", "jpeg"):
@@ -1800,7 +2577,7 @@ def _load_p5_hero(product_key: str, group: str):
             try:
                 obj  = s3.get_object(Bucket=bucket, Key=key)
                 data = obj["Body"].read()
-                img  = Image.open(BytesIO(data)).convert("RGBA")
+                img  = _open_rgba(data, CARD_HERO_DRAFT_PX)
                 return img, slot
             except Exception:
                 continue
@@ -1816,7 +2593,7 @@ def _scale_to_cover(img: Image.Image, W: int, H: int) -> Image.Image:
     scale  = max(W / iw, H / ih)
     new_w  = max(1, int(iw * scale))
     new_h  = max(1, int(ih * scale))
-    img    = img.resize((new_w, new_h), Image.LANCZOS)
+    img    = _resize_hero(img, (new_w, new_h))
     left   = (new_w - W) // 2
     top    = (new_h - H) // 2
     return img.crop((left, top, left + W, top + H))
@@ -1848,12 +2625,12 @@ def _render_p5(
 
     # Detect if "in-hand" photo is actually a bg-removed cutout
     # If so, treat it as composite mode (themed bg) instead of full-bleed
-    hero_has_transparency = hero.convert("RGBA").getchannel("A").getextrema()[0] < 200
+    hero_has_transparency = _as_rgba(hero).getchannel("A").getextrema()[0] < 200
     use_fullbleed = is_inhand and not hero_has_transparency
 
     if use_fullbleed:
         # ── Full-bleed photo mode (opaque in-hand photo) ───────────────
-        hero_rgba = hero.convert("RGBA")
+        hero_rgba = _as_rgba(hero)
         canvas = _scale_to_cover(hero_rgba, W, H)
         draw   = ImageDraw.Draw(canvas)
         text_color = (255, 255, 255, 255)
@@ -1875,13 +2652,11 @@ def _render_p5(
             a = int(100 * (1 - y / top_h) ** 1.8)
             tg_draw.line([(0, y), (W, y)], fill=(0, 0, 0, a))
         canvas.alpha_composite(top_grad)
-        draw = ImageDraw.Draw(canvas)
 
     else:
         # ── Composite mode (fallback cutout on themed background) ──────
         # Use themed bg so cutout edge anti-aliasing blends correctly
-        _tc = get_theme_colors(theme)
-        canvas = _make_gradient_bg_fast(W, H, _tc.get("p1_grad_start", (13, 92, 92)), _tc.get("p1_grad_end", (7, 56, 56)))
+        canvas = _theme_gradient_bg(theme, W, H).copy()
         draw   = ImageDraw.Draw(canvas)
         tc         = get_theme_colors(theme)
         text_color = tc["text"]
@@ -1892,7 +2667,7 @@ def _render_p5(
         scale    = target_h / hh
         new_w    = max(1, int(hw * scale))
         new_h    = max(1, int(hh * scale))
-        hero_rs  = hero.resize((new_w, new_h), Image.LANCZOS)
+        hero_rs  = _resize_hero(hero, (new_w, new_h))
 
         # ── Edge feathering: blur alpha channel to soften cutout edges ──
         r, g, b, a = hero_rs.split()
@@ -1903,9 +2678,7 @@ def _render_p5(
         py       = (H - new_h) // 2
 
         draw_radial_glow(canvas, px + new_w // 2, py + new_h // 2)
-        draw = ImageDraw.Draw(canvas)
-        canvas.alpha_composite(hero_rs, (px, py))
-        draw = ImageDraw.Draw(canvas)
+        _composite_hero(canvas, hero_rs, (px, py))
 
     # ── Brand + model (top-left) ──────────────────────────────────────
     text_max_w = int(W * 0.62) - pad
@@ -1937,7 +2710,7 @@ def _render_p5(
         by0      = top_pad + 8
         bx0      = bx1 - bw
         by1      = by0 + bh
-        draw_sticker_pill(draw, bx0, by0, bx1, by1, badge_text, bf)
+        draw_sticker_pill(canvas, draw, bx0, by0, bx1, by1, badge_text, bf)
 
     # ── 2-chip row (bottom, centered) ────────────────────────────────
     chip_font = load_font_bold(P5_CHIP_SIZE)
@@ -1969,9 +2742,7 @@ def _render_p5(
                 )
                 cur_x += CHIP_GAP_X + DIVIDER_WIDTH
 
-    out = BytesIO()
-    canvas.convert("RGB").save(out, format="PNG")
-    return out.getvalue()
+    return _png_bytes(canvas.convert("RGB"), compress_level=PNG_COMPRESS_LEVEL)
 
 
 @app.get("/render/p5")
@@ -2495,8 +3266,7 @@ def _render_p6(
     is_dark    = (theme or "").lower() in _P3_DARK_THEMES
 
     # ── Background ────────────────────────────────────────────────────
-    _tc = get_theme_colors(theme)
-    canvas = _make_gradient_bg_fast(W, H, _tc.get("p1_grad_start", (13, 92, 92)), _tc.get("p1_grad_end", (7, 56, 56)))
+    canvas = _theme_gradient_bg(theme, W, H).copy()
 
     # ── Ghost reel watermark (same approach as P8) ────────────────────
     if watermark_img is not None:
@@ -2548,8 +3318,8 @@ def _render_p6(
     pill_l    = pill_r - pw - P6_TAG_PAD_X * 2
     pill_t    = top_pad + 8
     pill_b    = pill_t + ph + P6_TAG_PAD_Y * 2
-    pill_rect = [pill_l, pill_t, pill_r, pill_b]
-    draw.rounded_rectangle(pill_rect, radius=20, outline=text_color[:3], width=2)
+    tile, mask = _rounded_shell(pill_r - pill_l, pill_b - pill_t, 20, None, text_color[:3], 2)
+    canvas.paste(tile, (pill_l, pill_t), mask)
     # Centre text inside pill using anchor='mm'
     pill_cx   = (pill_l + pill_r) // 2
     pill_cy   = (pill_t + pill_b) // 2
@@ -2562,17 +3332,18 @@ def _render_p6(
 
     chip_groups = []
     for i, c in enumerate(features):
-        tw, th    = text_size(draw, c, chip_font)
+        bbox      = draw_text_bbox(draw, c, chip_font)
+        tw, th    = bbox[2] - bbox[0], bbox[3] - bbox[1]
         icon_file = CHIP_ICONS.get(i)
         icon      = load_icon(icon_file, ICON_SIZE) if icon_file else None
         icon_w    = ICON_SIZE if icon else 0
         group_w   = (icon_w + ICON_TEXT_GAP + tw) if icon else tw
         group_h   = max(ICON_SIZE, th)
-        chip_groups.append((c, tw, th, group_w, group_h, icon, icon_w))
+        chip_groups.append((c, tw, th, bbox[1], group_w, group_h, icon, icon_w))
 
-    total_chips_w = sum(gw for _, _, _, gw, _, _, _ in chip_groups) + \
+    total_chips_w = sum(gw for _, _, _, _, gw, _, _, _ in chip_groups) + \
                     max(0, len(chip_groups) - 1) * (CHIP_GAP_X + DIVIDER_WIDTH) if chip_groups else 0
-    chip_row_h    = max((gh for _, _, _, _, gh, _, _ in chip_groups), default=0)
+    chip_row_h    = max((gh for _, _, _, _, _, gh, _, _ in chip_groups), default=0)
 
     # Position chip bar at bottom with safe margin
     CHIP_BOTTOM_MARGIN = 24
@@ -2618,14 +3389,9 @@ def _render_p6(
 
         # Translucent table background pill
         bg_fill = _P3_SPEC_BG_DARK if is_dark else _P3_SPEC_BG_LIGHT
-        spec_bg = Image.new("RGBA", (W, H), (0, 0, 0, 0))
-        spec_bg_draw = ImageDraw.Draw(spec_bg)
-        spec_bg_draw.rounded_rectangle(
-            (table_x0, table_top, table_x1, table_top + table_h),
-            radius=P6_TABLE_RADIUS, fill=bg_fill,
-        )
-        canvas.alpha_composite(spec_bg)
-        draw = ImageDraw.Draw(canvas)
+        canvas.alpha_composite(
+            _rounded_tile(table_x1 - table_x0, table_h, P6_TABLE_RADIUS, bg_fill),
+            (table_x0, table_top))
 
         header_fill = (255, 255, 255, 180) if is_dark else (60, 60, 60, 200)
         label_fill  = (255, 255, 255, 160) if is_dark else (60, 60, 60, 180)
@@ -2685,32 +3451,27 @@ def _render_p6(
 
     # ── Draw chip bar ─────────────────────────────────────────────────
     if chip_groups:
-        cur_x = (W - total_chips_w) // 2
-        for idx, (c, tw, th, gw, gh, icon, icon_w) in enumerate(chip_groups):
+        cur_x      = (W - total_chips_w) // 2
+        div_half_h = int(chip_row_h * 0.35)
+        last_idx   = len(chip_groups) - 1
+        for idx, (c, tw, th, top, gw, gh, icon, icon_w) in enumerate(chip_groups):
             if icon:
                 icon_y = chip_y_center - ICON_SIZE // 2
                 canvas.alpha_composite(icon, (cur_x, icon_y))
-                draw   = ImageDraw.Draw(canvas)
                 text_x = cur_x + icon_w + ICON_TEXT_GAP
             else:
                 text_x = cur_x
-            bbox   = draw.textbbox((0, 0), c, font=chip_font)
-            text_h = bbox[3] - bbox[1]
-            text_y = chip_y_center - text_h // 2 - bbox[1]
+            text_y = chip_y_center - th // 2 - top
             draw.text((text_x, text_y), c, font=chip_font, fill=chip_text_color)
             cur_x += gw
-            if idx < len(chip_groups) - 1:
-                div_x     = cur_x + CHIP_GAP_X // 2
-                div_y_top = chip_y_center - int(chip_row_h * 0.35)
-                div_y_bot = chip_y_center + int(chip_row_h * 0.35)
-                draw.line([(div_x, div_y_top), (div_x, div_y_bot)],
+            if idx < last_idx:
+                div_x = cur_x + CHIP_GAP_X // 2
+                draw.line([(div_x, chip_y_center - div_half_h), (div_x, chip_y_center + div_half_h)],
                           fill=divider_color, width=DIVIDER_WIDTH)
                 cur_x += CHIP_GAP_X + DIVIDER_WIDTH
 
     # ── Output ────────────────────────────────────────────────────────
-    out = BytesIO()
-    canvas.convert("RGB").save(out, format="PNG", optimize=True)
-    return out.getvalue()
+    return _png_bytes(canvas.convert("RGB"), compress_level=PNG_COMPRESS_LEVEL)
 
 
 @app.get("/render/p6")
@@ -2777,10 +3538,10 @@ P7_REEL_HEIGHT_RATIO = 0.72   # reel fills 72% of card height (measured after al
 
 def _load_p7_hero(product_key: str, group: str) -> tuple:
     """Waterfall: P7_BOX_PHOTO → P7_BOX_CUTOUT → P2_ANGLE_CUTOUT → P3_DETAIL_CUTOUT → P1_HERO_CUTOUT."""
-    bucket = os.environ.get("R2_BUCKET")
+    bucket = R2_BUCKET
     if not bucket:
         raise HTTPException(status_code=500, detail="Missing R2_BUCKET")
-    s3 = r2_client()
+    s3 = r2_reader()
     slots = ["P7_BOX_PHOTO", "P7_BOX_CUTOUT",
              "P2_ANGLE_CUTOUT", "P3_DETAIL_CUTOUT", "P1_HERO_CUTOUT"]
     pk_norm = _normalize_pk(product_key)
@@ -2790,7 +3551,7 @@ def _load_p7_hero(product_key: str, group: str) -> tuple:
             try:
                 obj  = s3.get_object(Bucket=bucket, Key=key)
                 data = obj["Body"].read()
-                img  = Image.open(BytesIO(data)).convert("RGBA")
+                img  = _open_rgba(data, CARD_HERO_DRAFT_PX)
                 return img, slot
             except Exception:
                 continue
@@ -2830,7 +3591,7 @@ def _render_p7(
         scale = max(W / hero.width, H / hero.height)
         rw    = max(1, int(hero.width  * scale))
         rh    = max(1, int(hero.height * scale))
-        bg    = hero.resize((rw, rh), Image.LANCZOS)
+        bg    = _resize_hero(hero, (rw, rh))
         ox    = (rw - W) // 2
         oy    = (rh - H) // 2
         canvas = bg.crop((ox, oy, ox + W, oy + H)).copy()
@@ -2853,8 +3614,7 @@ def _render_p7(
 
     else:
         # Theme background
-        _tc = get_theme_colors(theme)
-        canvas = _make_gradient_bg_fast(W, H, _tc.get("p1_grad_start", (13, 92, 92)), _tc.get("p1_grad_end", (7, 56, 56)))
+        canvas = _theme_gradient_bg(theme, W, H).copy()
         tc         = get_theme_colors(theme)
         text_color = tc["text"]
 
@@ -2863,7 +3623,7 @@ def _render_p7(
 
         # Crop transparent padding so ratio measures the actual reel body, not whitespace.
         if hero.mode == 'RGBA':
-            bbox = hero.split()[3].getbbox()   # alpha channel bounding box
+            bbox = hero.getbbox(alpha_only=True)   # alpha channel bounding box
             if bbox:
                 hero = hero.crop(bbox)
 
@@ -2873,10 +3633,10 @@ def _render_p7(
         scale    = target_h / hero.height
         rw = max(1, int(hero.width  * scale))
         rh = target_h
-        hero_rs  = hero.resize((rw, rh), Image.LANCZOS)
+        hero_rs  = _resize_hero(hero, (rw, rh))
         hx = int(W * 0.65) - rw // 2                       # centre reel at 65% of canvas
         hy = max(0, (H - rh) // 2 - 40)                    # 40px above vertical centre
-        canvas.alpha_composite(hero_rs, (max(0, hx), max(0, hy)))
+        _composite_hero(canvas, hero_rs, (max(0, hx), max(0, hy)))
 
     draw = ImageDraw.Draw(canvas)
 
@@ -2890,10 +3650,9 @@ def _render_p7(
         pill_w = bw + P7_BADGE_PAD_X * 2
         pill_h = bh + P7_BADGE_PAD_Y * 2
         bx    -= pill_w
-        pill_rect = [bx, by, bx + pill_w, by + pill_h]
-        draw.rounded_rectangle(pill_rect, radius=12,
-                                fill=STICKER_FILL[:3] + (220,),
-                                outline=STICKER_OUTLINE[:3], width=1)
+        tile, mask = _rounded_shell(pill_w, pill_h, 12, STICKER_FILL[:3] + (220,),
+                                    STICKER_OUTLINE[:3], 1)
+        canvas.paste(tile, (bx, by), mask)
         draw.text((bx + pill_w // 2, by + pill_h // 2),
                   btxt, font=badge_font, fill=STICKER_TEXT, anchor='mm')
         bx -= 8   # gap between pills
@@ -2965,9 +3724,7 @@ def _render_p7(
             ai_text, font=ai_font, fill=(*text_color[:3], 80))
 
     # ── Output ────────────────────────────────────────────────────────
-    out = BytesIO()
-    canvas.convert("RGB").save(out, format="PNG", optimize=True)
-    return out.getvalue()
+    return _png_bytes(canvas.convert("RGB"), compress_level=PNG_COMPRESS_LEVEL)
 
 
 @app.get("/render/p7")
@@ -3013,10 +3770,10 @@ def _load_p8_watermark(product_key: str, group: str) -> tuple:
     """Optional reel watermark for P8.  Tries P1->P2->P3 cutout slots in R2.
     Returns (PIL RGBA image, slot_name) or (None, '').  NEVER raises."""
     try:
-        bucket = os.environ.get("R2_BUCKET")
+        bucket = R2_BUCKET
         if not bucket:
             return None, ""
-        s3 = r2_client()
+        s3 = r2_reader()
         pk_norm = _normalize_pk(product_key)
         for slot in ("P1_HERO_CUTOUT", "P2_ANGLE_CUTOUT", "P3_DETAIL_CUTOUT"):
             for ext in ("png", "jpg", "jpeg"):
@@ -3024,7 +3781,7 @@ def _load_p8_watermark(product_key: str, group: str) -> tuple:
                 try:
                     obj  = s3.get_object(Bucket=bucket, Key=key)
                     data = obj["Body"].read()
-                    img  = Image.open(BytesIO(data)).convert("RGBA")
+                    img  = _open_rgba(data, CARD_HERO_DRAFT_PX)
                     return img, slot
                 except Exception:
                     continue
@@ -3074,8 +3831,7 @@ def _render_p8(
     text_color = tc["text"]
 
     # ── Background ────────────────────────────────────────────────────
-    _tc = get_theme_colors(theme)
-    canvas = _make_gradient_bg_fast(W, H, _tc.get("p1_grad_start", (13, 92, 92)), _tc.get("p1_grad_end", (7, 56, 56)))
+    canvas = _theme_gradient_bg(theme, W, H).copy()
 
     # Radial glow — right-side depth
     draw_radial_glow(canvas, W * 2 // 3, H // 2)
@@ -3143,7 +3899,7 @@ def _render_p8(
     draw_text_align_left(draw, pad, y, header_text, h_font, text_color)
     # Use bbox[3] (actual bottom pixel) not bbox[3]-bbox[1] (height) to avoid
     # the gold-line-through-text bug when top bearing (bbox[1]) > 0 for large fonts
-    y += draw.textbbox((0, 0), header_text, font=h_font)[3] + 18
+    y += draw_text_bbox(draw, header_text, h_font)[3] + 18
 
     # Gold accent line beneath header
     draw.line([(pad, y), (pad + 140, y)],
@@ -3168,7 +3924,7 @@ def _render_p8(
     ins   = max(5, cb // 5)   # inset for the X strokes
     cb_lw = 2                  # line width for box + X
     # Measure actual top bearing so checkbox aligns with visible text, not bbox origin
-    _tb   = draw.textbbox((0, 0), "Ag", font=p_font)
+    _tb   = draw_text_bbox(draw, "Ag", p_font)
     cb_fill = (*text_color[:3], 255)   # black (matches theme text colour)
     for item in items:
         cb_x = pad
@@ -3196,9 +3952,7 @@ def _render_p8(
                   font=sp_font, fill=(*text_color[:3], 100))
 
     # ── Output ────────────────────────────────────────────────────────
-    out = BytesIO()
-    canvas.convert("RGB").save(out, format="PNG", optimize=True)
-    return out.getvalue()
+    return _png_bytes(canvas.convert("RGB"), compress_level=PNG_COMPRESS_LEVEL)
 
 
 @app.get("/render/p8")
@@ -3254,7 +4008,7 @@ def prep_video_frame(
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to download cutout: {e}")
 
-    cutout = Image.open(BytesIO(cutout_data)).convert("RGBA")
+    cutout = _as_rgba(Image.open(BytesIO(cutout_data)))
     cutout = trim_transparent(cutout, pad=0)
 
     # Build dark studio background (locked Phase 1 rule: dark studio for video)
@@ -3277,7 +4031,7 @@ def prep_video_frame(
     scale = min(max_w / cw, max_h / ch)
     new_w = int(cw * scale)
     new_h = int(ch * scale)
-    cutout_resized = cutout.resize((new_w, new_h), Image.LANCZOS)
+    cutout_resized = _resize_hero(cutout, (new_w, new_h))
 
     # Centre on canvas
     x = (width - new_w) // 2
@@ -3293,11 +4047,12 @@ def prep_video_frame(
     png_bytes = buf.getvalue()
 
     if save_key:
-        bucket = os.environ.get("R2_BUCKET")
+        bucket = R2_BUCKET
         if bucket:
             try:
                 s3 = r2_client()
                 s3.put_object(Bucket=bucket, Key=save_key, Body=png_bytes, ContentType="image/png")
+                _r2_cache.pop(save_key)   # drop any stale cached copy
             except Exception as e:
                 pass  # Non-fatal — frame still returned
 
@@ -3340,7 +4095,7 @@ def prep_post_image(
         data = r2_get_object_bytes(hero_key)
     else:
         raise HTTPException(status_code=400, detail="Either hero_key or image_url required")
-    cutout = Image.open(BytesIO(data)).convert("RGBA")
+    cutout = _as_rgba(Image.open(BytesIO(data)))
     cutout = trim_transparent(cutout, pad=0)
 
     # ═══ BOLD POSTER STYLE — text behind product, dark moody bg ═══
@@ -3353,7 +4108,9 @@ def prep_post_image(
     # Darken to 30% brightness for dramatic look
     dark_start = tuple(max(0, int(c * 0.3)) for c in gs)
     dark_end = tuple(max(0, int(c * 0.15)) for c in ge)
-    bg = _make_gradient_bg_fast(width, height, dark_start, dark_end).convert("RGBA")
+    # Built per request: width/height come from the caller, and pinning
+    # arbitrary sizes in _cached_gradient_bg would evict the theme canvases.
+    bg = _make_gradient_bg_fast(width, height, dark_start, dark_end)
 
     # 3. (grain removed — too slow in production)
 
@@ -3391,7 +4148,7 @@ def prep_post_image(
     cw, ch = cutout.size
     scale = min(max_w / cw, max_h / ch)
     new_w, new_h = int(cw * scale), int(ch * scale)
-    cutout_resized = cutout.resize((new_w, new_h), Image.LANCZOS)
+    cutout_resized = _resize_hero(cutout, (new_w, new_h))
 
     # 7. Drop shadow behind product
     x = (width - new_w) // 2
@@ -3456,11 +4213,12 @@ def prep_post_image(
 
     r2_url = ""
     if save_key:
-        bucket = os.environ.get("R2_BUCKET")
+        bucket = R2_BUCKET
         if bucket:
             try:
                 s3 = r2_client()
                 s3.put_object(Bucket=bucket, Key=save_key, Body=png_bytes, ContentType="image/png")
+                _r2_cache.pop(save_key)   # drop any stale cached copy
                 r2_url = f"https://rerender-clean-studio.onrender.com/r2/get-image?key={save_key}"
             except Exception:
                 pass
@@ -3510,7 +4268,7 @@ def remove_bg_get(url: str = Query(..., description="Image URL to remove backgro
 
     # 2. Open and remove background
     try:
-        img = Image.open(BytesIO(resp.content)).convert("RGBA")
+        img = _as_rgba(Image.open(BytesIO(resp.content)))
         session = _get_rembg_session()
         result = remove(img, session=session)
     except Exception as e:
@@ -3532,7 +4290,7 @@ async def remove_bg_post(file: UploadFile = File(...)):
 
     data = await file.read()
     try:
-        img = Image.open(BytesIO(data)).convert("RGBA")
+        img = _as_rgba(Image.open(BytesIO(data)))
         session = _get_rembg_session()
         result = remove(img, session=session)
     except Exception as e: